@@ -0,0 +1,111 @@
+'''
+Binary cipher text container.
+A 64 byte header (magic, version, coefficient size, N, p, q, block count, length) is followed by the cipher text
+coefficients as a packed little-endian int16 or int32 (length, 2) array, which np.memmap and np.frombuffer use
+without copying.
+'''
+import struct
+
+import numpy as np
+
+from Eisenstein import EisensteinElement
+
+# 0xff never occurs in UTF-8, so a text format cipher text can't start with the magic
+MAGIC = b'\xffETRU'
+VERSION = 1
+HEADER = struct.Struct('<5sBBxI4iQQ')
+HEADER_SIZE = 64
+
+
+def coefficient_size(q: EisensteinElement) -> int:
+    '''Bytes per coordinate: canonical representatives mod q have coordinates of at most |q.x| + |q.y|'''
+    return 2 if abs(q.x) + abs(q.y) < 1 << 15 else 4
+
+
+class CipherHeader():
+    '''
+    Parameters of a cipher text. length is the number of (x, y) coefficients, block_count = length // N.
+    Both are 0 in a stream whose output could not be rewound, the payload then runs to the end of the file.
+    '''
+
+    def __init__(self, N: int, p: EisensteinElement, q: EisensteinElement, length=0, itemsize=None):
+        self.N = N
+        self.p = p
+        self.q = q
+        self.length = length
+        self.itemsize = coefficient_size(q) if itemsize is None else itemsize
+
+    @property
+    def block_count(self) -> int:
+        return self.length // self.N
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(f'<i{self.itemsize}')
+
+    def pack(self) -> bytes:
+        header = HEADER.pack(MAGIC, VERSION, self.itemsize, self.N, self.p.x, self.p.y, self.q.x, self.q.y,
+                             self.block_count, self.length)
+        return header.ljust(HEADER_SIZE, b'\x00')
+
+    @classmethod
+    def unpack(cls, data: bytes):
+        if not is_binary(data) or len(data) < HEADER_SIZE:
+            raise ValueError("Not a binary cipher text")
+        magic, version, itemsize, N, px, py, qx, qy, block_count, length = HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ValueError(f"Unsupported cipher text version {version}")
+        return cls(N, EisensteinElement(px, py), EisensteinElement(qx, qy), length, itemsize)
+
+    def check(self, N: int, p: EisensteinElement, q: EisensteinElement):
+        '''Raise ValueError if the cipher text was made with other parameters than the key'''
+        if (self.N, self.p.x, self.p.y, self.q.x, self.q.y) != (N, p.x, p.y, q.x, q.y):
+            raise ValueError(f"Cipher text parameters N={self.N}, p={self.p}, q={self.q} don't match the key")
+
+    def payload_length(self, payload_bytes: int) -> int:
+        if self.length:
+            return self.length
+        return payload_bytes // (2 * self.itemsize)
+
+
+def is_binary(data: bytes) -> bool:
+    return data[:len(MAGIC)] == MAGIC
+
+
+def dumps(output: np.ndarray, N: int, p: EisensteinElement, q: EisensteinElement) -> bytes:
+    '''Binary container of cipher text coefficients'''
+    header = CipherHeader(N, p, q, len(output.reshape(-1, 2)))
+    return header.pack() + np.ascontiguousarray(output, dtype=header.dtype).tobytes()
+
+
+def loads(data: bytes):
+    '''Header and (length, 2) coefficient view of a binary container held in memory'''
+    header = CipherHeader.unpack(data)
+    length = header.payload_length(len(data) - HEADER_SIZE)
+    array = np.frombuffer(data, dtype=header.dtype, count=2 * length, offset=HEADER_SIZE)
+    return header, array.reshape(-1, 2)
+
+
+def load(path):
+    '''Header and memory-mapped (length, 2) coefficient array of a binary container file'''
+    with open(path, 'rb') as file:
+        header = read_header(file)
+        file.seek(0, 2)
+        length = header.payload_length(file.tell() - HEADER_SIZE)
+    if length == 0:
+        return header, np.zeros((0, 2), dtype=header.dtype)
+    return header, np.memmap(path, dtype=header.dtype, mode='r', offset=HEADER_SIZE, shape=(length, 2))
+
+
+def read_header(file) -> CipherHeader:
+    return CipherHeader.unpack(file.read(HEADER_SIZE))
+
+
+if __name__ == "__main__":
+    p = EisensteinElement(2, 3)
+    q = EisensteinElement(0, 167)
+    output = np.random.default_rng(0).integers(-83, 84, size=(2 * 251, 2))
+    data = dumps(output, 251, p, q)
+    header, array = loads(data)
+    print(f"{len(data)} bytes, {header.block_count} blocks of N={header.N}, p={header.p}, q={header.q}, "
+          f"{header.dtype} coefficients, same: {np.array_equal(array, output)}")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+'''ETRU daemon client, talks to `etru.py serve` over a Unix socket.
+
+Usage:
+  ETRUClient.py [options] enc PUB_KEY_FILE [FILE]
+  ETRUClient.py [options] dec PRIV_KEY_FILE [FILE]
+  ETRUClient.py (-h | --help)
+
+Options:
+  --socket=PATH      Socket of the daemon [default: etru.sock].
+  -b, --block        Block mode.
+  -x, --binary       Binary cipher text container.
+  -h, --help         Show this screen.
+
+Only the standard library is imported, so a request costs no numpy import or key loading.
+Every message is a frame: header and payload lengths as two little-endian uint32, a JSON header, the payload.
+'''
+import json
+import os
+import socket
+import struct
+import sys
+
+FRAME = struct.Struct('<II')
+
+
+def pack_frame(header: dict, payload: bytes) -> bytes:
+    header = json.dumps(header).encode()
+    return FRAME.pack(len(header), len(payload)) + header + payload
+
+
+def _receive(connection: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Daemon closed the connection")
+        data += chunk
+    return bytes(data)
+
+
+def read_frame(connection: socket.socket):
+    header_size, payload_size = FRAME.unpack(_receive(connection, FRAME.size))
+    header = json.loads(_receive(connection, header_size))
+    return header, _receive(connection, payload_size)
+
+
+class Client():
+    '''Connection to the daemon, requests on one connection are answered in order'''
+
+    def __init__(self, socket_path: str):
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(socket_path)
+
+    def request(self, op: str, key_file: str, payload: bytes, block=False, binary=False) -> bytes:
+        '''
+        op 'enc': payload is the message, returns the cipher text in the text or binary format.
+        op 'dec': payload is a cipher text in either format, returns the message.
+        '''
+        header = {'op': op, 'key': os.path.abspath(key_file), 'block': block, 'binary': binary}
+        self.connection.sendall(pack_frame(header, payload))
+        header, payload = read_frame(self.connection)
+        if 'error' in header:
+            raise RuntimeError(header['error'])
+        return payload
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    # docopt would do, but a hand-rolled parser keeps the client free of third party imports
+    argv = sys.argv[1:]
+    if not argv or '-h' in argv or '--help' in argv:
+        print(__doc__)
+        sys.exit(0)
+    options = {'socket': 'etru.sock', 'block': False, 'binary': False}
+    positional = []
+    args = iter(argv)
+    for arg in args:
+        if arg.startswith('--socket='):
+            options['socket'] = arg.split('=', 1)[1]
+        elif arg == '--socket':
+            options['socket'] = next(args)
+        elif arg in ('-b', '--block'):
+            options['block'] = True
+        elif arg in ('-x', '--binary'):
+            options['binary'] = True
+        else:
+            positional.append(arg)
+    if len(positional) not in (2, 3) or positional[0] not in ('enc', 'dec'):
+        print(__doc__)
+        sys.exit(1)
+    op, key_file = positional[:2]
+    if len(positional) == 3 and positional[2] != '-':
+        with open(positional[2], 'rb') as file:
+            payload = file.read()
+    else:
+        payload = sys.stdin.buffer.read()
+    with Client(options['socket']) as client:
+        output = client.request(op, key_file, payload, block=options['block'], binary=options['binary'])
+    sys.stdout.buffer.write(output)
+    if op == 'dec' and not options['block']:
+        # the same output as etru.py dec, which prints the message
+        sys.stdout.buffer.write(b'\n')
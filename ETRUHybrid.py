@@ -0,0 +1,182 @@
+'''
+Hybrid encryption for bulk data. ETRU encrypts a random seed in a single block, the session keys are derived from
+the seed and that block, and the payload is encrypted with a SHAKE-128 keystream and authenticated chunk by chunk
+with HMAC-SHA256, encrypt-then-MAC. The public-key cost is one block per message, whatever its size, and the
+cipher text is longer than the payload by the header, that block and TAG_SIZE bytes per chunk.
+Format: a 32 byte header (magic, version, coefficient size, N, p, q, chunk size), the cipher text block of the
+seed as packed int16 or int32 coordinates like CipherFile, then every chunk of the payload XOR the keystream
+followed by its tag. Tags cover the chunk index and whether it is the last one, so chunks can't be reordered,
+dropped or cut off, and decryption writes no chunk before its tag checks out.
+'''
+import hashlib
+import hmac
+import io
+import struct
+
+import numpy as np
+
+from CipherFile import coefficient_size
+from classETRU import ETRU
+from Eisenstein import EisensteinElement
+from utils import RP_COORDINATES, coordinates_to_digits, decode_chunks, encode_chunks
+
+# 0xff never occurs in UTF-8, and the magic differs from that of CipherFile
+MAGIC = b'\xffEHYB'
+VERSION = 1
+HEADER = struct.Struct('<5sBBxI4iI')
+HEADER_SIZE = 32
+CHUNK_SIZE = 1 << 20
+# largest chunk decrypt_file() accepts, the header is untrusted and decryption buffers two chunks
+MAX_CHUNK_SIZE = 64 << 20
+TAG_SIZE = 32
+SEED_SIZE = 32
+
+
+def is_hybrid(data: bytes) -> bool:
+    return data[:len(MAGIC)] == MAGIC
+
+
+def session_keys(seed: bytes, block: np.ndarray) -> tuple:
+    '''(keystream key, MAC key) of a seed and the cipher text block that carries it'''
+    keys = hashlib.shake_256(b'ETRU hybrid' + seed + np.ascontiguousarray(block, dtype='<i8').tobytes()).digest(64)
+    return keys[:32], keys[32:]
+
+
+def encapsulate(etru: ETRU):
+    '''
+    Cipher text block of a fresh seed, and the session keys.
+    The seed is encoded like a block of block mode, etru107 carries 28 of its SEED_SIZE bytes.
+    Raises ValueError for keys of a balanced set, whose blocks fail to decrypt too often to carry a whole payload.
+    '''
+    if etru.params.balanced:
+        raise ValueError(f"Keys of {etru.params.name} lose about a third of hybrid cipher texts, "
+                         f"use keys of a sparse set such as etru251s")
+    seed = etru.sampler.random_bytes(min(SEED_SIZE, etru.params.chunk_size))
+    digits = encode_chunks(seed, etru.params.block_size)
+    message = np.zeros((1, etru.N, 2), dtype=np.int64)
+    message[:, etru.N - etru.params.block_size:] = RP_COORDINATES[digits]
+    block = etru.encrypt_batch(message, etru.random_blinding_batch(1))[0]
+    return block, session_keys(seed, block)
+
+
+def decapsulate(etru: ETRU, block: np.ndarray) -> tuple:
+    '''Session keys of a cipher text block of encapsulate(), raises ValueError if it doesn't decrypt'''
+    message = etru.decrypt_batch(np.asarray(block, dtype=np.int64).reshape(1, etru.N, 2))
+    if message[:, :etru.N - etru.params.block_size].any():
+        raise ValueError("Session key block was not decrypted correctly, wrong key?")
+    seed = decode_chunks(coordinates_to_digits(message[:, etru.N - etru.params.block_size:]))
+    return session_keys(seed, block)
+
+
+def _keystream_xor(key: bytes, index: int, data: bytes) -> bytes:
+    keystream = hashlib.shake_128(key + index.to_bytes(8, 'little')).digest(len(data))
+    return np.bitwise_xor(np.frombuffer(data, dtype=np.uint8), np.frombuffer(keystream, dtype=np.uint8)).tobytes()
+
+
+def _tag(key: bytes, index: int, final: bool, data: bytes) -> bytes:
+    mac = hmac.new(key, index.to_bytes(8, 'little') + bytes([final]), 'sha256')
+    mac.update(data)
+    return mac.digest()
+
+
+def seal_chunk(keys: tuple, index: int, final: bool, chunk: bytes) -> bytes:
+    '''Encrypted chunk followed by its tag'''
+    data = _keystream_xor(keys[0], index, chunk)
+    return data + _tag(keys[1], index, final, data)
+
+
+def open_chunk(keys: tuple, index: int, final: bool, sealed: bytes) -> bytes:
+    '''Inverse of seal_chunk(), raises ValueError if the tag doesn't match'''
+    if len(sealed) < TAG_SIZE:
+        raise ValueError(f"Cipher text chunk {index} is truncated")
+    data, tag = sealed[:-TAG_SIZE], sealed[-TAG_SIZE:]
+    if not hmac.compare_digest(tag, _tag(keys[1], index, final, data)):
+        raise ValueError(f"Cipher text chunk {index} failed authentication")
+    return _keystream_xor(keys[0], index, data)
+
+
+def encrypt_file(etru: ETRU, input_file, output_file, chunk_size=CHUNK_SIZE):
+    '''Encrypt input_file (binary) to output_file (binary) as it goes, memory use is a few chunks'''
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"Chunk size {chunk_size} out of range, at most {MAX_CHUNK_SIZE}")
+    block, keys = encapsulate(etru)
+    header = HEADER.pack(MAGIC, VERSION, coefficient_size(etru.q), etru.N, etru.p.x, etru.p.y, etru.q.x, etru.q.y,
+                         chunk_size)
+    output_file.write(header.ljust(HEADER_SIZE, b'\x00'))
+    output_file.write(block.astype(f'<i{coefficient_size(etru.q)}').tobytes())
+    index, chunk = 0, input_file.read(chunk_size)
+    while True:
+        # one chunk read ahead, the last chunk is tagged as such, an empty input has a single empty chunk
+        following = input_file.read(chunk_size)
+        output_file.write(seal_chunk(keys, index, not following, chunk))
+        if not following:
+            break
+        index, chunk = index + 1, following
+
+
+def decrypt_file(etru: ETRU, input_file, output_file):
+    '''
+    Decrypt the cipher text of encrypt_file() from input_file (binary) to output_file (binary) as it goes.
+    Raises ValueError on a malformed header, a cipher text of other parameters than the key, or a chunk that fails
+    authentication, the chunks before it are written already.
+    '''
+    header = input_file.read(HEADER_SIZE)
+    if not is_hybrid(header) or len(header) < HEADER_SIZE:
+        raise ValueError("Not a hybrid cipher text")
+    magic, version, itemsize, N, px, py, qx, qy, chunk_size = HEADER.unpack_from(header)
+    if version != VERSION:
+        raise ValueError(f"Unsupported hybrid cipher text version {version}")
+    if itemsize not in (2, 4):
+        raise ValueError(f"Unsupported coefficient size {itemsize} in hybrid cipher text")
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"Chunk size {chunk_size} of hybrid cipher text out of range")
+    p, q = EisensteinElement(px, py), EisensteinElement(qx, qy)
+    if (N, p, q) != (etru.N, etru.p, etru.q):
+        raise ValueError(f"Cipher text parameters N={N}, p={p}, q={q} don't match the key")
+    block = np.frombuffer(input_file.read(2 * N * itemsize), dtype=f'<i{itemsize}')
+    if len(block) != 2 * N:
+        raise ValueError("Hybrid cipher text is truncated")
+    keys = decapsulate(etru, block.reshape(N, 2))
+    index, sealed = 0, input_file.read(chunk_size + TAG_SIZE)
+    while True:
+        following = input_file.read(chunk_size + TAG_SIZE)
+        output_file.write(open_chunk(keys, index, not following, sealed))
+        if not following:
+            break
+        index, sealed = index + 1, following
+
+
+def encrypt(etru: ETRU, data: bytes, chunk_size=CHUNK_SIZE) -> bytes:
+    output = io.BytesIO()
+    encrypt_file(etru, io.BytesIO(data), output, chunk_size)
+    return output.getvalue()
+
+
+def decrypt(etru: ETRU, data: bytes) -> bytes:
+    output = io.BytesIO()
+    decrypt_file(etru, io.BytesIO(data), output)
+    return output.getvalue()
+
+
+if __name__ == "__main__":
+    import os
+    import time
+
+    from ETRUKeyGen import generate_keys
+    from ETRUParameters import parameters
+
+    etru = next(generate_keys(parameters('etru251s')))
+    data = os.urandom(64 << 20)
+    start = time.perf_counter()
+    cipher = encrypt(etru, data)
+    middle = time.perf_counter()
+    plain = decrypt(etru, cipher)
+    end = time.perf_counter()
+    print(f"64 MiB: encrypt {64 / (middle - start):.0f} MiB/s, decrypt {64 / (end - middle):.0f} MiB/s, "
+          f"{len(cipher) - len(data)} bytes overhead, round trip: {plain == data}")
+    tampered = bytearray(cipher)
+    tampered[-100] ^= 1
+    try:
+        decrypt(etru, bytes(tampered))
+    except ValueError as error:
+        print(f"tampered cipher text: {error}")
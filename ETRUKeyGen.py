@@ -0,0 +1,162 @@
+'''
+Key generation over a process pool, and a pool of ready key pairs for services that issue keys on demand.
+About one candidate f in seven isn't invertible mod p. generate_keys() runs one candidate per worker, takes the
+first invertible ones and terminates the workers still busy with the rest.
+'''
+import contextlib
+import multiprocessing
+import queue
+import threading
+
+import numpy as np
+
+from classETRU import ETRU, RANDOM_KEY
+from EisensteinArray import EisensteinRingElement
+from ETRUParameters import ParameterSet, parameters
+
+
+def _candidate(params, key_mode):
+    '''
+    Keys of one candidate f, (f, g, f_p, f_q, h) arrays, or None if f isn't invertible.
+    params is the name of a named set, which the worker looks up, or an unnamed ParameterSet.
+    N, p and q wouldn't do, etru251 and etru251s share them.
+    '''
+    if isinstance(params, str):
+        params = parameters(params)
+    etru = ETRU.from_parameters(params)
+    try:
+        etru.generate_public_keys(etru.random_f(key_mode), etru.random_g(), key_mode)
+    except ZeroDivisionError:
+        return None
+    return tuple(etru.ring(poly).array for poly in
+                 (etru.f_poly, etru.g_poly, etru.f_p_poly, etru.f_q_poly, etru.h_poly))
+
+
+def _context(params: ParameterSet, key_mode, arrays) -> ETRU:
+    '''ETRU instance with the keys of a candidate, in the state ETRU.generate_public_keys leaves it in'''
+    etru = ETRU.from_parameters(params)
+    etru.f_poly, etru.g_poly, etru.f_p_poly, etru.f_q_poly, h = (EisensteinRingElement(array, params.N)
+                                                                 for array in arrays)
+    etru.key_mode = key_mode
+    etru.set_public_key(h)
+    return etru
+
+
+def generate_keys(params: ParameterSet, key_mode=RANDOM_KEY, count=1, jobs=1, tries=10):
+    '''
+    Yield count ETRU instances with fresh keys, or without end if count is None.
+    With jobs > 1 every worker process tries one candidate f at a time. Closing the generator terminates
+    the workers, candidates still running are abandoned.
+    Raises an Exception after tries candidates in a row weren't invertible, like ETRU.generate_random_keys.
+    '''
+    if jobs <= 1:
+        produced = 0
+        while count is None or produced < count:
+            etru = ETRU.from_parameters(params)
+            etru.generate_random_keys(key_mode, tries)
+            yield etru
+            produced += 1
+        return
+    results = queue.SimpleQueue()
+    args = (params.name or params, key_mode)
+    # Pool.__exit__ terminates the workers, which cancels the candidates that are still running
+    with multiprocessing.Pool(jobs) as pool:
+        for _ in range(jobs):
+            pool.apply_async(_candidate, args, callback=results.put, error_callback=results.put)
+        running, produced, failures = jobs, 0, 0
+        while count is None or produced < count:
+            arrays = results.get()
+            running -= 1
+            if isinstance(arrays, BaseException):
+                raise arrays
+            if arrays is None:
+                failures += 1
+                if failures >= tries:
+                    raise Exception("Couldn't generate invertible f")
+            else:
+                failures = 0
+                produced += 1
+            # a new candidate only while fewer are running than keys are still needed
+            if count is None or running < count - produced:
+                pool.apply_async(_candidate, args, callback=results.put, error_callback=results.put)
+                running += 1
+            if arrays is not None:
+                yield _context(params, key_mode, arrays)
+
+
+class KeyPool():
+    '''
+    Keeps up to size ready key pairs, generated by a background thread with generate_keys().
+    get() takes one and the thread makes a new one in its place.
+    '''
+
+    def __init__(self, params: ParameterSet, size=4, key_mode=RANDOM_KEY, jobs=1):
+        self.params = params
+        self.key_mode = key_mode
+        self.jobs = jobs
+        self._ready = queue.Queue(maxsize=size)
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _fill(self):
+        try:
+            with contextlib.closing(generate_keys(self.params, self.key_mode, None, self.jobs)) as keys:
+                for etru in keys:
+                    while not self._stop.is_set():
+                        try:
+                            self._ready.put(etru, timeout=0.1)
+                            break
+                        except queue.Full:
+                            pass
+                    if self._stop.is_set():
+                        return
+        except Exception as error:
+            self._error = error
+
+    def get(self, timeout=None) -> ETRU:
+        '''A ready ETRU instance with fresh keys, waits for one if the pool is empty'''
+        while True:
+            try:
+                return self._ready.get(timeout=0.1 if timeout is None else timeout)
+            except queue.Empty:
+                if self._error is not None:
+                    raise self._error
+                if timeout is not None:
+                    raise
+
+    def qsize(self) -> int:
+        return self._ready.qsize()
+
+    def close(self):
+        '''Stop the background thread, keys already generated are dropped'''
+        self._stop.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from ETRUParameters import parameters
+
+    params = parameters(sys.argv[1] if len(sys.argv) > 1 else 'etru251')
+    for jobs in (1, 4):
+        start = time.perf_counter()
+        keys = list(generate_keys(params, count=8, jobs=jobs))
+        print(f"8 key pairs of {params.name} with {jobs} process(es): {time.perf_counter() - start:.2f} s")
+    etru = keys[0]
+    message = EisensteinRingElement(np.zeros((params.N, 2), dtype=np.int64), params.N)
+    print(f"round trip: {etru.decrypt(etru.encrypt(message, etru.random_blinding())) == message}")
+    with KeyPool(params, size=4, jobs=2) as pool:
+        time.sleep(1)
+        start = time.perf_counter()
+        pool.get()
+        print(f"key pair from a pool of {pool.qsize() + 1}: {(time.perf_counter() - start) * 1000:.3f} ms")
@@ -0,0 +1,119 @@
+'''
+Named ETRU parameter sets, a throughput/security trade-off per deployment.
+A key file records the name of its set, every set builds its tables (R_poly, residue tables, block size)
+once, when they are first used, and shares them with every ETRU instance of the set.
+The weights are the numbers of nonzero unit coefficients of f, g and the blinding polynomial r, and of F for
+private keys f = 1 + p*F. Balanced sets draw them as the paper does, the same number of every unit, f and g with
+about 6N/7 of them and r with 6N/8. Then f*e = p*r*g + f*m leaves the fundamental domain of q often, etru251
+fails to decrypt about 45% of full blocks and 30% of hybrid seed blocks, 58% and 40% with f = 1 + p*F.
+The other sets keep fewer units at uniform positions, small enough that decryption doesn't fail in practice,
+etru251s failed on none of 23000 blocks, and on one of 23000 with f = 1 + p*F.
+F is sparser than a random f, p*F*m grows with d(p) = 7.
+'''
+import functools
+import math
+
+from Eisenstein import ONE, ZERO, EisensteinElement
+from EisensteinPolynomial import EisensteinPolynomial
+from EisensteinResidues import residues
+from utils import chunk_size
+
+
+def calculate_decimal_digits(n):
+    decimal_digits = math.ceil((n * math.log2(7)) / math.log2(10))
+    return decimal_digits
+
+
+def block_size(N):
+    '''Number of base-7 message digits in one block of block mode'''
+    n = (calculate_decimal_digits(N) - 1) // 2 - 2
+    return n * 2  # n must be odd
+
+
+class ParameterSet():
+    def __init__(self, name, N: int, p: EisensteinElement, q: EisensteinElement, f_weight: int, g_weight: int,
+                 r_weight: int, F_weight: int, description='', balanced=False):
+        self.name = name
+        self.N = N
+        self.p = p
+        self.q = q
+        self.f_weight = f_weight
+        self.g_weight = g_weight
+        self.r_weight = r_weight
+        self.F_weight = F_weight
+        self.description = description
+        self.balanced = balanced
+
+    def __str__(self):
+        return f"{self.name or 'custom'}: N={self.N}, p={self.p}, q={self.q}"
+
+    def matches(self, N: int, p: EisensteinElement, q: EisensteinElement) -> bool:
+        return (self.N, self.p, self.q) == (N, p, q)
+
+    @functools.cached_property
+    def R_poly(self) -> EisensteinPolynomial:
+        '''x^N - 1'''
+        return EisensteinPolynomial([ONE] + [ZERO] * (self.N - 1) + [ZERO - ONE])
+
+    @functools.cached_property
+    def p_residues(self):
+        return residues(self.p.x, self.p.y)
+
+    @functools.cached_property
+    def q_residues(self):
+        return residues(self.q.x, self.q.y)
+
+    @functools.cached_property
+    def block_size(self) -> int:
+        return block_size(self.N)
+
+    @functools.cached_property
+    def chunk_size(self) -> int:
+        '''Bytes per block of block and stream mode'''
+        return chunk_size(self.block_size)
+
+
+P = EisensteinElement(2, 3)
+
+PARAMETER_SETS = {
+    'etru107': ParameterSet('etru107', 107, P, EisensteinElement(0, 167), 56, 56, 56, 36,
+                            "small N for high throughput and low latency"),
+    'etru251': ParameterSet('etru251', 251, P, EisensteinElement(0, 167), 6 * (251 // 7) + 1, 6 * (251 // 7),
+                            6 * (251 // 8), 48, "N, p, q and key distribution of the paper, not for hybrid mode",
+                            balanced=True),
+    'etru251s': ParameterSet('etru251s', 251, P, EisensteinElement(0, 167), 84, 84, 84, 48,
+                             "N, p and q of the paper with sparse keys that decrypt reliably, the default"),
+    'etru503': ParameterSet('etru503', 503, P, EisensteinElement(0, 251), 200, 200, 200, 80,
+                            "large N and q for stronger security"),
+}
+DEFAULT = 'etru251s'
+
+
+def parameters(name: str) -> ParameterSet:
+    if name not in PARAMETER_SETS:
+        raise ValueError(f"Unknown parameter set {name}, choose one of {', '.join(PARAMETER_SETS)}")
+    return PARAMETER_SETS[name]
+
+
+@functools.lru_cache(maxsize=None)
+def _find_parameters(N: int, px: int, py: int, qx: int, qy: int) -> ParameterSet:
+    p, q = EisensteinElement(px, py), EisensteinElement(qx, qy)
+    for params in PARAMETER_SETS.values():
+        if params.matches(N, p, q):
+            return params
+    return ParameterSet(None, N, p, q, N // 3, N // 3, N // 3, N // 5)
+
+
+def find_parameters(N: int, p: EisensteinElement, q: EisensteinElement) -> ParameterSet:
+    '''
+    The named set with these N, p and q, e.g. for key files that don't record their set.
+    Other values get an unnamed set with weights N // 3 and N // 5 for F, shared the same way.
+    '''
+    return _find_parameters(N, p.x, p.y, q.x, q.y)
+
+
+if __name__ == "__main__":
+    for params in PARAMETER_SETS.values():
+        print(f"{params}, {'balanced ' if params.balanced else ''}weights f={params.f_weight} g={params.g_weight} "
+              f"r={params.r_weight} F={params.F_weight}, "
+              f"{params.block_size} digits = {params.chunk_size} bytes per block, {params.description}")
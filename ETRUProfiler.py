@@ -0,0 +1,239 @@
+'''
+Opt-in instrumentation of the hot paths, used by `etru.py --profile`.
+start() wraps the functions listed in HOOKS in place and stop() puts the originals back, nothing is wrapped
+otherwise, so the instrumentation costs nothing while it is off.
+Wrapped calls increment their counter and charge their time to a phase. Phase times are exclusive, a phase
+running inside another one is not charged to the outer phase as well, and time outside every phase is 'other'.
+Only the calling thread of this process is measured, work of -j worker processes is not included.
+'''
+import collections
+import functools
+import importlib
+import json
+import os
+import sys
+import time
+import types
+
+
+def _encrypt_batch_counts(msg_blocks, rand_blocks, ph, q) -> dict:
+    '''Native encryption does the product by p*h and the reduction mod q of every block, as the NumPy path'''
+    return {'ring multiplications': len(msg_blocks), 'array reductions': len(msg_blocks)}
+
+
+def _decrypt_batch_counts(cipher_blocks, f, f_p, p, q) -> dict:
+    '''Products by f and f_p and reductions mod q and p of every block, no product by f_p of f = 1 + p*F'''
+    return {'ring multiplications': len(cipher_blocks) * (1 if f_p is None else 2),
+            'array reductions': 2 * len(cipher_blocks)}
+
+
+# (module, function or Class.method, counter, phase), counter or phase is None if the call isn't counted or timed.
+# counter is a function of the call arguments for native kernels, which do the work of several counters at once
+HOOKS = [
+    ('Eisenstein', 'EisensteinElement.__init__', 'scalar allocations', None),
+    ('Eisenstein', 'EisensteinElement.__divmod__', 'scalar reductions', None),
+    ('Eisenstein', 'EisensteinElement.invert', 'scalar inversions', None),
+    ('EisensteinResidues', 'EisensteinResidues.reduce_element', 'scalar reductions', None),
+    ('EisensteinResidues', 'EisensteinResidues.invert_element', 'scalar inversions', None),
+    ('EisensteinPolynomial', 'EisensteinPolynomial.__init__', 'polynomial allocations', None),
+    ('EisensteinArray', 'EisensteinArrayPolynomial.__init__', 'polynomial allocations', None),
+    ('EisensteinArray', 'EisensteinRingElement.__init__', 'polynomial allocations', None),
+    ('EisensteinPolynomial', 'EisensteinPolynomial.__mul__', 'ring multiplications', 'multiply'),
+    ('classETRU', 'ETRU.ring_mul', 'ring multiplications', 'multiply'),
+    ('classETRU', 'ETRU.ring_mul_batch', 'ring multiplications', 'multiply'),
+    ('EisensteinKernels', 'encrypt_batch', _encrypt_batch_counts, 'native'),
+    ('EisensteinKernels', 'decrypt_batch', _decrypt_batch_counts, 'native'),
+    ('ETRUHybrid', 'encapsulate', None, 'kem'),
+    ('ETRUHybrid', 'decapsulate', None, 'kem'),
+    ('ETRUHybrid', 'seal_chunk', None, 'dem'),
+    ('ETRUHybrid', 'open_chunk', None, 'dem'),
+    ('EisensteinPolynomial', '_divmod', 'polynomial reductions', 'reduce'),
+    ('EisensteinArray', 'cvp_divmod', 'array reductions', 'reduce'),
+    ('EisensteinResidues', 'EisensteinResidues.reduce', 'array reductions', 'reduce'),
+    ('EisensteinPolynomial', 'EisensteinPolynomial.invert', 'polynomial inversions', 'invert'),
+    ('EisensteinField', 'EisensteinField.invert_polynomial', 'polynomial inversions', 'invert'),
+    ('ETRUSampler', 'Sampler.indices', 'random polynomials', 'sample'),
+    ('etru', 'random_blocks', None, 'sample'),
+    ('classETRU', 'ETRU.__init__', None, 'setup'),
+    ('etru', '_load_public_key', None, 'setup'),
+    ('etru', '_load_private_key', None, 'setup'),
+    ('utils', 'eisenstein_encode', None, 'encode'),
+    ('utils', 'encode_chunks', None, 'encode'),
+    ('etru', 'message_blocks', None, 'encode'),
+    ('utils', 'eisenstein_decode', None, 'decode'),
+    ('utils', 'eisenstein_decode_array', None, 'decode'),
+    ('utils', 'coordinates_to_digits', None, 'decode'),
+    ('utils', 'decode_chunks', None, 'decode'),
+    ('etru', 'cipher_to_text', None, 'io'),
+    ('etru', 'text_to_cipher', None, 'io'),
+    ('etru', 'read_cipher', None, 'io'),
+    ('CipherFile', 'dumps', None, 'io'),
+    ('CipherFile', 'loads', None, 'io'),
+    ('CipherFile', 'load', None, 'io'),
+]
+# methods taking a stack of blocks, or a number of them, count one per block
+BATCHED = {'ETRU.ring_mul_batch', 'Sampler.indices'}
+# blinding is the random polynomial r and the product r*p*h
+RENAMES = {('encrypt', 'sample'): 'blind', ('encrypt', 'multiply'): 'blind'}
+# phases whose calls are neither counted nor timed separately, e.g. building the residue tables of a key context
+OPAQUE = {'setup'}
+
+_active = None
+_patches = []
+
+
+class Profile():
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.counts = collections.Counter()
+        self.times = collections.Counter()
+        self.calls = collections.Counter()
+        self.total = 0.0
+        self.start = time.perf_counter()
+        # time spent in nested phases of every running phase, the first entry is the whole operation
+        self._nested = [0.0]
+        self._opaque = 0
+
+    def count(self, counter: str, amount=1):
+        self.counts[counter] += amount
+
+    def timed(self, phase: str, function, args, kwargs):
+        phase = RENAMES.get((self.operation, phase), phase)
+        opaque = phase in OPAQUE
+        self._opaque += opaque
+        self._nested.append(0.0)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._opaque -= opaque
+            nested = self._nested.pop()
+            self._nested[-1] += elapsed
+            self.times[phase] += elapsed - nested
+            self.calls[phase] += 1
+
+    def finish(self):
+        self.total = time.perf_counter() - self.start
+        self.times['other'] += self.total - self._nested[0]
+
+    def as_dict(self) -> dict:
+        return {
+            'operation': self.operation,
+            'total_s': self.total,
+            'phases': {phase: {'calls': self.calls[phase], 'seconds': seconds}
+                       for phase, seconds in self.times.most_common()},
+            'counts': dict(sorted(self.counts.items())),
+        }
+
+    def report(self) -> str:
+        lines = [f"Profile of {self.operation}: {self.total * 1000:.3f} ms",
+                 f"  {'phase':<24}{'calls':>10}{'ms':>12}{'share':>9}"]
+        for phase, seconds in self.times.most_common():
+            share = seconds / self.total if self.total else 0.0
+            lines.append(f"  {phase:<24}{self.calls[phase]:>10}{seconds * 1000:>12.3f}{share:>9.1%}")
+        lines.append(f"  {'counter':<24}{'count':>10}")
+        for counter, count in sorted(self.counts.items()):
+            lines.append(f"  {counter:<24}{count:>10}")
+        return '\n'.join(lines)
+
+
+def _wrap(function, counter, phase, batched):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        profile = _active
+        if profile is None or profile._opaque:
+            return function(*args, **kwargs)
+        if callable(counter):
+            for name, amount in counter(*args, **kwargs).items():
+                profile.count(name, amount)
+        elif counter:
+            amount = 1
+            if batched:
+                amount = args[1] if isinstance(args[1], int) else len(args[1])
+            profile.count(counter, amount)
+        if phase is None:
+            return function(*args, **kwargs)
+        return profile.timed(phase, function, args, kwargs)
+    return wrapper
+
+
+def _module(name: str) -> types.ModuleType:
+    '''Module name, which is __main__ while it runs as a script such as etru.py'''
+    main_file = getattr(sys.modules['__main__'], '__file__', None) or ''
+    if name not in sys.modules and os.path.splitext(os.path.basename(main_file))[0] == name:
+        return sys.modules['__main__']
+    return importlib.import_module(name)
+
+
+def _package_modules() -> list:
+    '''Loaded modules of this directory'''
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return [module for module in list(sys.modules.values())
+            if os.path.dirname(os.path.abspath(getattr(module, '__file__', None) or '')) == directory]
+
+
+def _install():
+    for module_name, name, counter, phase in HOOKS:
+        owner = _module(module_name)
+        attribute = name
+        if '.' in name:
+            class_name, attribute = name.split('.')
+            owner = getattr(owner, class_name)
+        # vars() rather than getattr(), so that a subclass doesn't pick up the method of its base class
+        original = vars(owner)[attribute]
+        wrapper = _wrap(original, counter, phase, name in BATCHED)
+        _patches.append((owner, attribute, original))
+        setattr(owner, attribute, wrapper)
+        if isinstance(owner, types.ModuleType):
+            # names imported with `from module import ...` are bound in the importing modules as well
+            for module in _package_modules():
+                if module is not owner and getattr(module, attribute, None) is original:
+                    _patches.append((module, attribute, original))
+                    setattr(module, attribute, wrapper)
+
+
+def _uninstall():
+    while _patches:
+        owner, attribute, original = _patches.pop()
+        setattr(owner, attribute, original)
+
+
+def start(operation: str) -> Profile:
+    '''Instrument the hot paths and start a profile of operation'''
+    global _active
+    if _active is not None:
+        raise RuntimeError(f"Already profiling {_active.operation}")
+    _install()
+    _active = Profile(operation)
+    return _active
+
+
+def stop() -> Profile:
+    '''Finish the running profile and remove the instrumentation'''
+    global _active
+    profile, _active = _active, None
+    _uninstall()
+    profile.finish()
+    return profile
+
+
+def stop_and_report(output_file=None):
+    '''stop(), then print the report to standard error or write it to output_file as JSON'''
+    profile = stop()
+    if output_file:
+        with open(output_file, 'w') as file:
+            json.dump(profile.as_dict(), file, indent=2)
+    else:
+        print(profile.report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    import etru
+
+    profile = start('encrypt')
+    cipher = etru.encrypt('key_pub.npz', "I am Maozihao")
+    print(stop().report())
+    start('decrypt')
+    etru.decrypt('key_priv.npz', cipher.reshape(-1, 2))
+    print(stop().report())
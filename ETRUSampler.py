@@ -0,0 +1,96 @@
+'''
+Random unit polynomials for keys and blinding, drawn many at a time as integer arrays.
+The random bytes come from os.urandom, or from SHAKE-256 of a seed for reproducible runs,
+so every polynomial of a batch costs a few vectorized array operations instead of Python sampling.
+'''
+import hashlib
+import itertools
+import os
+
+import numpy as np
+
+from EisensteinSparse import UnitPolynomial
+from utils import RP_COORDINATES
+
+
+class Sampler():
+    '''
+    Sampler of polynomials with a fixed number of unit coefficients, the others zero, at uniform positions with
+    uniform units, or balanced over the units as in the paper.
+    Without a seed every draw reads os.urandom, which forked worker processes don't share.
+    With a seed the draws are SHAKE-256(seed || counter), the same sequence of calls gives the same polynomials.
+    '''
+
+    def __init__(self, seed: bytes = None):
+        if isinstance(seed, str):
+            seed = seed.encode()
+        self.seed = seed
+        self._counter = itertools.count()
+
+    def random_bytes(self, size: int) -> bytes:
+        if self.seed is None:
+            return os.urandom(size)
+        block = next(self._counter).to_bytes(8, 'little')
+        return hashlib.shake_256(self.seed + block).digest(size)
+
+    def _uint64(self, shape) -> np.ndarray:
+        return np.frombuffer(self.random_bytes(8 * int(np.prod(shape))), dtype=np.uint64).reshape(shape)
+
+    def indices(self, count: int, N: int, weight: int) -> np.ndarray:
+        '''
+        (count, N) int8 indices into RP_ELEMENTS, weight of them in every row are units and the others 0.
+        The positions of the units are a uniform subset, the smallest weight of N random keys, and every unit
+        is uniform over the six, up to a bias of 2^-61.
+        '''
+        if not 0 <= weight <= N:
+            raise ValueError(f"Weight {weight} out of range for N={N}")
+        indices = np.zeros((count, N), dtype=np.int8)
+        if weight == 0 or count == 0:
+            return indices
+        positions = np.argpartition(self._uint64((count, N)), weight - 1, axis=1)[:, :weight]
+        units = (self._uint64((count, weight)) % 6 + 1).astype(np.int8)
+        np.put_along_axis(indices, positions, units, axis=1)
+        return indices
+
+    def balanced_indices(self, count: int, N: int, weight: int) -> np.ndarray:
+        '''
+        (count, N) int8 indices like indices(), with the units of the paper's keys: every one of the six
+        weight // 6 times and weight % 6 more ones, shuffled with weight // 6 zeros into the lowest degrees.
+        '''
+        per_unit, extra = divmod(weight, 6)
+        span = 7 * per_unit + extra
+        if weight < 0 or span > N:
+            raise ValueError(f"Weight {weight} out of range for N={N}")
+        indices = np.zeros((count, N), dtype=np.int8)
+        if span == 0 or count == 0:
+            return indices
+        units = np.concatenate([np.repeat(np.arange(1, 7, dtype=np.int8), per_unit), np.ones(extra, dtype=np.int8),
+                                np.zeros(per_unit, dtype=np.int8)])
+        indices[:, N - span:] = units[np.argsort(self._uint64((count, span)), axis=1)]
+        return indices
+
+    def coordinates(self, count: int, N: int, weight: int, balanced=False) -> np.ndarray:
+        '''(count, N, 2) coefficients of count polynomials, highest degree first'''
+        if balanced:
+            return RP_COORDINATES[self.balanced_indices(count, N, weight)]
+        return RP_COORDINATES[self.indices(count, N, weight)]
+
+    def unit_polynomial(self, N: int, weight: int, balanced=False) -> UnitPolynomial:
+        return UnitPolynomial.from_array(self.coordinates(1, N, weight, balanced)[0])
+
+
+if __name__ == "__main__":
+    import time
+
+    sampler = Sampler()
+    for count in (1, 64, 4096):
+        start = time.perf_counter()
+        blocks = sampler.coordinates(count, 251, 84)
+        elapsed = time.perf_counter() - start
+        print(f"{count:>5} blinding polynomials of N=251: {elapsed * 1000:8.3f} ms, "
+              f"weights {set(np.count_nonzero(blocks.any(axis=2), axis=1).tolist())}")
+    indices = sampler.balanced_indices(1, 251, 211)[0]
+    print(f"balanced f of N=251: units {np.bincount(indices, minlength=7)[1:].tolist()}, "
+          f"degree {250 - np.flatnonzero(indices)[0]}")
+    same = np.array_equal(Sampler(b'seed').indices(8, 251, 84), Sampler(b'seed').indices(8, 251, 84))
+    print(f"seeded samplers agree: {same}")
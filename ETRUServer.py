@@ -0,0 +1,206 @@
+'''
+Local ETRU daemon on a Unix socket, see ETRUClient.py for the protocol.
+Key contexts stay warm in the key cache of etru.py. Concurrent requests with the same operation and key are
+collected for WINDOW seconds after the first one, or until there are MAX_BATCH of them,
+and run through ETRU as one batch.
+'''
+import asyncio
+import json
+import os
+
+import numpy as np
+
+import CipherFile
+import etru
+from EisensteinArray import EisensteinRingElement
+from ETRUClient import FRAME, pack_frame
+from utils import (coordinates_to_digits, decode_chunks, eisenstein_decode_array, eisenstein_encode,
+                   encode_chunks)
+
+WINDOW = 0.002
+MAX_BATCH = 256
+
+
+class Request():
+    def __init__(self, header: dict, payload: bytes):
+        self.op = header['op']
+        self.key = header['key']
+        self.block = bool(header.get('block'))
+        self.binary = bool(header.get('binary'))
+        self.payload = payload
+        self.blocks = None
+        self.future = None
+
+
+def _message_blocks(context, request: Request) -> np.ndarray:
+    '''(B, N, 2) message blocks of an enc request, the same encoding as etru.encrypt'''
+    if request.block:
+        return etru.message_blocks(context, encode_chunks(request.payload, context.params.block_size))
+    message = eisenstein_encode(request.payload.decode('utf-8'), context.N)
+    return EisensteinRingElement.from_list(message, context.N).array[None]
+
+
+def _cipher_blocks(context, request: Request) -> np.ndarray:
+    '''(B, N, 2) cipher text blocks of a dec request in either format'''
+    if CipherFile.is_binary(request.payload):
+        header, cipher = CipherFile.loads(request.payload)
+        header.check(context.N, context.p, context.q)
+    else:
+        cipher = etru.text_to_cipher(request.payload.decode())
+    if len(cipher) == 0:
+        raise ValueError("Empty cipher text")
+    return np.asarray(cipher, dtype=np.int64).reshape(-1, context.N, 2)
+
+
+def _encrypt_output(context, request: Request, output: np.ndarray) -> bytes:
+    if request.binary:
+        return CipherFile.dumps(output, context.N, context.p, context.q)
+    return etru.cipher_to_text(output).encode()
+
+
+def _decrypt_output(context, request: Request, output: np.ndarray) -> bytes:
+    if request.block:
+        return decode_chunks(coordinates_to_digits(output[:, context.N - context.params.block_size:]))
+    return eisenstein_decode_array(output[0])
+
+
+def run_batch(op: str, key: str, requests: list) -> list:
+    '''
+    Encrypt or decrypt the blocks of all requests with one encrypt_batch or decrypt_batch call.
+    :return: output bytes or the exception of every request
+    '''
+    try:
+        context = etru.load_private_key(key) if op == 'dec' else etru.load_public_key(key)
+    except Exception as error:
+        return [error] * len(requests)
+    results = [None] * len(requests)
+    for i, request in enumerate(requests):
+        try:
+            request.blocks = _cipher_blocks(context, request) if op == 'dec' else _message_blocks(context, request)
+        except Exception as error:
+            results[i] = error
+    valid = [i for i in range(len(requests)) if results[i] is None]
+    if not valid:
+        return results
+    blocks = np.concatenate([requests[i].blocks for i in valid])
+    if op == 'dec':
+        outputs, finish = context.decrypt_batch(blocks), _decrypt_output
+    else:
+        outputs, finish = context.encrypt_batch(blocks, etru.random_blocks(context, len(blocks))), _encrypt_output
+    start = 0
+    for i in valid:
+        count = len(requests[i].blocks)
+        try:
+            results[i] = finish(context, requests[i], outputs[start:start + count])
+        except Exception as error:
+            results[i] = error
+        start += count
+    return results
+
+
+class Batcher():
+    '''Collects requests per (op, key) and runs every group as one batch in a worker thread'''
+
+    def __init__(self, window=WINDOW, max_batch=MAX_BATCH):
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = {}
+
+    def submit(self, request: Request) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        request.future = loop.create_future()
+        group = (request.op, request.key)
+        if group not in self.pending:
+            self.pending[group] = []
+            loop.call_later(self.window, self.flush, group)
+        self.pending[group].append(request)
+        if len(self.pending[group]) >= self.max_batch:
+            self.flush(group)
+        return request.future
+
+    def flush(self, group):
+        requests = self.pending.pop(group, None)
+        if requests:
+            asyncio.ensure_future(self._run(group, requests))
+
+    async def _run(self, group, requests):
+        results = await asyncio.get_running_loop().run_in_executor(None, run_batch, *group, requests)
+        for request, result in zip(requests, results):
+            if isinstance(result, Exception):
+                request.future.set_exception(result)
+            else:
+                request.future.set_result(result)
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, batcher: Batcher):
+    try:
+        while True:
+            try:
+                header_size, payload_size = FRAME.unpack(await reader.readexactly(FRAME.size))
+            except asyncio.IncompleteReadError:
+                break
+            # both parts are read first, so that a malformed header gets its error frame and the next frame is read
+            header = await reader.readexactly(header_size)
+            payload = await reader.readexactly(payload_size)
+            try:
+                request = Request(json.loads(header), payload)
+                if request.op not in ('enc', 'dec'):
+                    raise ValueError(f"Unknown operation {request.op}")
+                writer.write(pack_frame({}, await batcher.submit(request)))
+            except Exception as error:
+                writer.write(pack_frame({'error': f"{type(error).__name__}: {error}"}, b''))
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(socket_path: str, window=WINDOW, max_batch=MAX_BATCH):
+    '''Serve on socket_path until cancelled, the socket is only accessible by its owner'''
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    batcher = Batcher(window, max_batch)
+    server = await asyncio.start_unix_server(lambda r, w: _handle(r, w, batcher), path=socket_path)
+    os.chmod(socket_path, 0o600)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        os.unlink(socket_path)
+
+
+if __name__ == "__main__":
+    import sys
+    import threading
+    import time
+
+    from ETRUClient import Client
+
+    socket_path = sys.argv[1] if len(sys.argv) > 1 else 'etru.sock'
+    count = 200
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(serve(socket_path))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    while not os.path.exists(socket_path):
+        time.sleep(0.01)
+
+    def work(results):
+        with Client(socket_path) as client:
+            for _ in range(count // 8):
+                cipher = client.request('enc', 'key_pub.npz', b"I am Maozihao")
+                try:
+                    results.append(client.request('dec', 'key_priv.npz', cipher))
+                except RuntimeError as error:
+                    # a decryption failure surfaces as an error of this request only
+                    results.append(error)
+
+    results = []
+    start = time.perf_counter()
+    threads = [threading.Thread(target=work, args=(results,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(f"{len(results)} enc + dec round trips from 8 clients in {elapsed:.2f} s, "
+          f"{results.count(b'I am Maozihao')} decrypted correctly")
+    loop.call_soon_threadsafe(task.cancel)
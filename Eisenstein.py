@@ -3,9 +3,13 @@ Definition of Eisenstein Integer and Eisenstein Integer Ring
 Guided by paper "ETRU: NTRU over the Eisenstein integers"
 '''
 
-import helpers
 import os
 
+try:
+    import helpers
+except ImportError:
+    helpers = None
+
 
 def _extended_eucild(f, g):
     '''Extended Euclid Algorithm
@@ -15,11 +19,11 @@ def _extended_eucild(f, g):
     '''
     h = f
     l = g
-    u = EisensteinElement(0, 0)
-    v = EisensteinElement(1, 0)
-    a = EisensteinElement(1, 0)
-    b = EisensteinElement(0, 0)
-    while l != EisensteinElement(0, 0):
+    u = ZERO
+    v = ONE
+    a = ONE
+    b = ZERO
+    while l:
         q, r = h.__divmod__(l)  # q=h//q,r=h%l
         h = l
         l = r
@@ -27,11 +31,37 @@ def _extended_eucild(f, g):
         d = b
         a = u
         b = v
-        u = c - q * u
-        v = d - q * v
+        u = mul_sub(c, q, u)
+        v = mul_sub(d, q, v)
     return h, a, b
 
 
+def cvp(x: int, y: int, mx: int, my: int):
+    '''
+    CVP algorithm on plain coordinates, see EisensteinElement.__divmod__.
+    :return: qx, qy, rx, ry with x + yω = (qx + qyω)(mx + myω) + (rx + ryω)
+    '''
+    Q = mx * mx - mx * my + my * my
+    d = 2 * Q
+    s = x * (2 * mx - my) + y * (2 * my - mx)
+    t = y * mx - x * my
+    x0 = s // d + (s % d > Q)
+    x1 = t // d + (t % d > Q)
+    q1x, q1y = x0 + x1, 2 * x1
+    r1x, r1y = x - (mx * q1x - my * q1y), y - (mx * q1y + my * q1x - my * q1y)
+    s += Q
+    t -= Q
+    y0 = s // d + (s % d > Q)
+    y1 = t // d + (t % d > Q)
+    q2x, q2y = y0 + y1, 2 * y1 + 1
+    r2x, r2y = x - (mx * q2x - my * q2y), y - (mx * q2y + my * q2x - my * q2y)
+    norm1 = r1x * r1x - r1x * r1y + r1y * r1y
+    norm2 = r2x * r2x - r2x * r2y + r2y * r2y
+    if norm1 < norm2 or (norm1 == norm2 and x0 < y0):
+        return q1x, q1y, r1x, r1y
+    return q2x, q2y, r2x, r2y
+
+
 def is_prime(n: int) -> bool:
     for i in range(2, int(n ** 0.5) + 1):
         if n % i == 0:
@@ -41,10 +71,30 @@ def is_prime(n: int) -> bool:
 
 # a+bW
 class EisensteinElement():
+    '''
+    Immutable x + yω. Instances are shared, see interned(), so x and y can't be reassigned.
+    '''
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.dtype = EisensteinElement
+        _set_x(self, x)
+        _set_y(self, y)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("EisensteinElement is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("EisensteinElement is immutable")
+
+    def __reduce__(self):
+        return EisensteinElement, (self.x, self.y)
+
+    def __setstate__(self, state):
+        '''Key files written before __slots__ pickled the instance __dict__, with a dtype entry'''
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        _set_x(self, state['x'])
+        _set_y(self, state['y'])
 
     def __bool__(self):
         if self.x == 0 and self.y == 0:
@@ -78,26 +128,20 @@ class EisensteinElement():
 
     def __eq__(self, other):
         if isinstance(other, EisensteinElement):
-            if self.x == other.x and self.y == other.y:
-                return True
-            else:
-                return False
-        raise TypeError('Not the same type of data')
+            return self.x == other.x and self.y == other.y
+        return NotImplemented
 
     def __ne__(self, other):
         if isinstance(other, EisensteinElement):
-            if self.x == other.x and self.y == other.y:
-                return False
-            else:
-                return True
-        raise TypeError('Not the same type of data')
+            return self.x != other.x or self.y != other.y
+        return NotImplemented
 
     def __pow__(self, exponent: int):
         '''
         Fast power algorithm
         :return: EisensteinElement: self ** exponent
         '''
-        result = EisensteinElement(1, 0)
+        result = ONE
         base = self
 
         while exponent > 0:
@@ -129,30 +173,8 @@ class EisensteinElement():
         :return: r2: EisensteinElement, b2: EisensteinElement. Quotient and remainder
         '''
         if isinstance(other, EisensteinElement):
-            epsilon1 = 2 * other.x - other.y
-            epsilon2 = 2 * other.y - other.x
-            Q = other.norm
-            d = 2 * Q
-            s = self.x * epsilon1 + self.y * epsilon2
-            t = self.y * other.x - self.x * other.y
-            x0 = (s - s % d + d) // d if s % d > Q else (s - s % d) // d
-            x1 = (t - t % d + d) // d if t % d > Q else (t - t % d) // d
-            r1 = EisensteinElement(x0 + x1, 2 * x1)
-            b1 = self - other * r1
-            s += Q
-            t -= Q
-            y0 = (s - s % d + d) // d if s % d > Q else (s - s % d) // d
-            y1 = (t - t % d + d) // d if t % d > Q else (t - t % d) // d
-            r2 = EisensteinElement(y0 + y1, 2 * y1 + 1)
-            b2 = self - other * r2
-            if b1.norm < b2.norm:
-                return r1, b1
-            elif b1.norm > b2.norm:
-                return r2, b2
-            elif x0 < y0:
-                return r1, b1
-            else:
-                return r2, b2
+            qx, qy, rx, ry = cvp(self.x, self.y, other.x, other.y)
+            return EisensteinElement(qx, qy), EisensteinElement(rx, ry)
         return NotImplemented
 
     def __mod__(self, other):
@@ -173,18 +195,8 @@ class EisensteinElement():
             Consider 6 units in Eisenstein Integer
             '''
             h, a, b = _extended_eucild(self, mod)
-            if h == EisensteinElement(1, 0):
-                return a
-            elif h == EisensteinElement(-1, 0):
-                return EisensteinElement(0, 0) - a
-            elif h == EisensteinElement(0, 1):
-                return a * EisensteinElement(-1, -1)
-            elif h == EisensteinElement(0, -1):
-                return a * EisensteinElement(1, 1)
-            elif h == EisensteinElement(-1, -1):
-                return a * EisensteinElement(0, 1)
-            elif h == EisensteinElement(1, 1):
-                return a * EisensteinElement(0, -1)
+            if h in UNIT_INVERSES:
+                return a * UNIT_INVERSES[h]
             raise ZeroDivisionError(f"{self} has no inverse in mod {mod.__str__()}")
 
     @property
@@ -193,13 +205,49 @@ class EisensteinElement():
         Proposition 4.2.4: If φ ∈ Z[ω] and d (φ) = p where p is a rational prime, then φ is a prime in Z[ω].
         :return: bool: True or False
         '''
-        # if is_prime(self.norm):
+        if helpers is None:
+            return self.norm > 1 and is_prime(self.norm)
         if helpers.is_prime(self.norm):
             return True
         else:
             return False
 
 
+_set_x = EisensteinElement.x.__set__
+_set_y = EisensteinElement.y.__set__
+
+SMALL = 8
+_INTERNED = [EisensteinElement(x, y) for x in range(-SMALL, SMALL + 1) for y in range(-SMALL, SMALL + 1)]
+
+
+def interned(x: int, y: int) -> EisensteinElement:
+    '''Shared instance of x + yω when both coordinates are at most SMALL in absolute value, a new one otherwise'''
+    if -SMALL <= x <= SMALL and -SMALL <= y <= SMALL:
+        return _INTERNED[(x + SMALL) * (2 * SMALL + 1) + y + SMALL]
+    return EisensteinElement(x, y)
+
+
+ZERO = interned(0, 0)
+ONE = interned(1, 0)
+# R_p = {0, ±1, ±ω, ±ω^2} in base-7 digit order, ω^2 = -1 - ω
+RP_ELEMENTS = [interned(0, 0), interned(1, 0), interned(-1, 0), interned(0, 1), interned(0, -1), interned(1, 1),
+               interned(-1, -1)]
+# inverse of each of the 6 units
+UNIT_INVERSES = {interned(1, 0): interned(1, 0), interned(-1, 0): interned(-1, 0),
+                 interned(0, 1): interned(-1, -1), interned(-1, -1): interned(0, 1),
+                 interned(0, -1): interned(1, 1), interned(1, 1): interned(0, -1)}
+
+
+def mul_add(a: EisensteinElement, b: EisensteinElement, c: EisensteinElement) -> EisensteinElement:
+    '''a + b*c with no intermediate element'''
+    return EisensteinElement(a.x + b.x * c.x - b.y * c.y, a.y + b.x * c.y + b.y * c.x - b.y * c.y)
+
+
+def mul_sub(a: EisensteinElement, b: EisensteinElement, c: EisensteinElement) -> EisensteinElement:
+    '''a - b*c with no intermediate element'''
+    return EisensteinElement(a.x - b.x * c.x + b.y * c.y, a.y - b.x * c.y - b.y * c.x + b.y * c.y)
+
+
 # os.system("g++ -O3 -Wall -shared -std=c++11 -undefined dynamic_lookup $(python3 -m pybind11 --includes) helpers.cpp -o helpers.so")
 
 if __name__ == "__main__":
@@ -0,0 +1,313 @@
+'''
+NumPy-backed Eisenstein Polynomial.
+Coefficients are stored as a contiguous (len, 2) int64 array of (x, y) pairs, x + y*omega,
+highest degree first, the same order as EisensteinPolynomial.coefficients.
+'''
+import functools
+
+import numpy as np
+
+from Eisenstein import EisensteinElement
+from EisensteinPolynomial import EisensteinPolynomial
+
+
+def _as_pairs(coefficients) -> np.ndarray:
+    '''Convert a list of EisensteinElement to a (len, 2) int64 array'''
+    array = np.empty((len(coefficients), 2), dtype=np.int64)
+    for i, coeff in enumerate(coefficients):
+        array[i, 0] = coeff.x
+        array[i, 1] = coeff.y
+    return array
+
+
+def mul(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    '''Coefficient-wise Eisenstein product of two (..., 2) arrays, same formula as EisensteinElement.__mul__'''
+    x = a[..., 0] * b[..., 0] - a[..., 1] * b[..., 1]
+    y = a[..., 0] * b[..., 1] + a[..., 1] * b[..., 0] - a[..., 1] * b[..., 1]
+    return np.stack((x, y), axis=-1)
+
+
+def norm(a: np.ndarray) -> np.ndarray:
+    '''Norms x^2 - xy + y^2 of a (..., 2) array, same as EisensteinElement.norm'''
+    return a[..., 0] ** 2 - a[..., 0] * a[..., 1] + a[..., 1] ** 2
+
+
+def conjugate(a: np.ndarray) -> np.ndarray:
+    '''Conjugates of a (..., 2) array, same as EisensteinElement.conjugate'''
+    return np.stack((a[..., 0], -a[..., 1]), axis=-1)
+
+
+def _round(s: np.ndarray, d: int, Q: int) -> np.ndarray:
+    '''Round s / d to the nearest integer, halves (s % d == Q) downwards'''
+    return s // d + (s % d > Q)
+
+
+def cvp_divmod(a: np.ndarray, mod: EisensteinElement):
+    '''
+    CVP Algorithm over a (..., 2) array, coefficient-wise the same as EisensteinElement.__divmod__,
+    including the choice between the two candidates when their remainders have equal norm.
+    :return: quotients, remainders: (..., 2) arrays such that a = quotients * mod + remainders
+    '''
+    epsilon1 = 2 * mod.x - mod.y
+    epsilon2 = 2 * mod.y - mod.x
+    Q = mod.norm
+    d = 2 * Q
+    m = np.array([mod.x, mod.y], dtype=np.int64)
+    s = a[..., 0] * epsilon1 + a[..., 1] * epsilon2
+    t = a[..., 1] * mod.x - a[..., 0] * mod.y
+    x0 = _round(s, d, Q)
+    x1 = _round(t, d, Q)
+    r1 = np.stack((x0 + x1, 2 * x1), axis=-1)
+    b1 = a - mul(m, r1)
+    y0 = _round(s + Q, d, Q)
+    y1 = _round(t - Q, d, Q)
+    r2 = np.stack((y0 + y1, 2 * y1 + 1), axis=-1)
+    b2 = a - mul(m, r2)
+    n1 = norm(b1)
+    n2 = norm(b2)
+    first = ((n1 < n2) | ((n1 == n2) & (x0 < y0)))[..., None]
+    return np.where(first, r1, r2), np.where(first, b1, b2)
+
+
+def cvp_mod(a: np.ndarray, mod: EisensteinElement) -> np.ndarray:
+    '''Canonical remainders of a (..., 2) array modulo mod, same as EisensteinElement % mod'''
+    return cvp_divmod(a, mod)[1]
+
+
+def _strip(array: np.ndarray) -> np.ndarray:
+    '''Remove leading zero coefficients'''
+    nonzero = np.flatnonzero(array.any(axis=1))
+    if nonzero.size == 0:
+        return array[:0]
+    return array[nonzero[0]:]
+
+
+# float64 matrix products are exact while every partial sum stays below 2^53
+_FLOAT_EXACT = 1 << 53
+
+
+@functools.lru_cache(maxsize=None)
+def _ring_index(N: int) -> np.ndarray:
+    '''
+    Index table of multiplication in Z[ω][x]/(x^N - 1) with coefficients highest degree first:
+    (a*b)[k] = sum over i of a[i] * b[(k - i - 1) % N], so b[_ring_index(N)][i, k] pairs a[i] with b.
+    '''
+    i = np.arange(N)
+    return (i[None, :] - i[:, None] - 1) % N
+
+
+def _ring_matrix(array: np.ndarray) -> np.ndarray:
+    '''(2, N, N) ring matrices of the x and y coordinates of a (N, 2) array'''
+    index = _ring_index(len(array))
+    return np.stack((array[:, 0][index], array[:, 1][index]))
+
+
+def _ring_mul(matrix: np.ndarray, a: np.ndarray) -> np.ndarray:
+    '''
+    Cyclic product of a (..., N, 2) array with the ring element whose ring matrix is given.
+    The wrap-around of x^N = 1 is part of the index table, no 2N-length product is built.
+    '''
+    mx, my = matrix
+    ax, ay = a[..., 0].astype(matrix.dtype), a[..., 1].astype(matrix.dtype)
+    ayy = ay @ my
+    x = ax @ mx - ayy
+    y = ax @ my + ay @ mx - ayy
+    return np.stack((x, y), axis=-1).astype(np.int64)
+
+
+class EisensteinArrayPolynomial():
+    def __init__(self, coefficients):
+        self.array = np.ascontiguousarray(coefficients, dtype=np.int64).reshape(-1, 2)
+
+    @classmethod
+    def from_list(cls, coefficients: list):
+        return cls(_as_pairs(coefficients))
+
+    @classmethod
+    def from_polynomial(cls, poly: EisensteinPolynomial):
+        return cls.from_list(poly.coefficients)
+
+    def to_list(self) -> list:
+        return [EisensteinElement(x, y) for x, y in self.array.tolist()]
+
+    def to_polynomial(self) -> EisensteinPolynomial:
+        return EisensteinPolynomial(self.to_list())
+
+    @property
+    def coefficients(self) -> list:
+        return self.to_list()
+
+    def __len__(self):
+        return len(self.array)
+
+    def __bool__(self):
+        return bool(self.array.any())
+
+    def __str__(self):
+        return self.to_polynomial().__str__()
+
+    def __eq__(self, other):
+        if isinstance(other, EisensteinArrayPolynomial):
+            return np.array_equal(self.array, other.array)
+        return NotImplemented
+
+    def __ne__(self, other):
+        if isinstance(other, EisensteinArrayPolynomial):
+            return not np.array_equal(self.array, other.array)
+        return NotImplemented
+
+    def __add__(self, other):
+        if isinstance(other, EisensteinArrayPolynomial):
+            # Align the lowest degree, like EisensteinPolynomial.__add__
+            if len(self.array) >= len(other.array):
+                array = self.array.copy()
+                array[len(array) - len(other.array):] += other.array
+            else:
+                array = other.array.copy()
+                array[len(array) - len(self.array):] += self.array
+            return EisensteinArrayPolynomial(array)
+        return NotImplemented
+
+    def __neg__(self):
+        return EisensteinArrayPolynomial(-self.array)
+
+    def __sub__(self, other):
+        if isinstance(other, EisensteinArrayPolynomial):
+            return self + (-other)
+        return NotImplemented
+
+    def __mul__(self, other):
+        if isinstance(other, int):
+            return EisensteinArrayPolynomial(self.array * other)
+        if isinstance(other, EisensteinElement):
+            return EisensteinArrayPolynomial(mul(self.array, np.array([other.x, other.y], dtype=np.int64)))
+        if isinstance(other, EisensteinArrayPolynomial):
+            if len(self.array) == 0 or len(other.array) == 0:
+                return EisensteinArrayPolynomial(self.array[:0])
+            a, b = self.array[:, 0], self.array[:, 1]
+            c, d = other.array[:, 0], other.array[:, 1]
+            bd = np.convolve(b, d)
+            x = np.convolve(a, c) - bd
+            y = np.convolve(a, d) + np.convolve(b, c) - bd
+            return EisensteinArrayPolynomial(np.stack((x, y), axis=-1))
+        return NotImplemented
+
+    def __mod__(self, other):
+        if isinstance(other, int):
+            return EisensteinArrayPolynomial(self.array % other)
+        if isinstance(other, EisensteinElement):
+            return EisensteinArrayPolynomial(cvp_mod(self.array, other))
+        if isinstance(other, EisensteinArrayPolynomial):
+            # Long division, other's leading coefficient must be one
+            divisor = other.array
+            if len(divisor) == 0 or not divisor.any():
+                raise ZeroDivisionError("Polynomial division by zero")
+            remainder = self.array.copy()
+            while len(remainder) >= len(divisor):
+                remainder[:len(divisor)] -= mul(remainder[0], divisor)
+                remainder = _strip(remainder)
+            return EisensteinArrayPolynomial(remainder)
+        raise TypeError("Unsupported operand type for %")
+
+
+class EisensteinRingElement(EisensteinArrayPolynomial):
+    '''
+    Element of Z[ω][x]/(x^N - 1), always stored as exactly N coefficients, highest degree first.
+    Longer inputs are folded with x^N = 1, shorter ones are padded with leading zeros.
+    '''
+
+    def __init__(self, coefficients, N: int):
+        array = np.ascontiguousarray(coefficients, dtype=np.int64).reshape(-1, 2)
+        if len(array) != N:
+            folded = np.zeros((N, 2), dtype=np.int64)
+            degrees = np.arange(len(array) - 1, -1, -1) % N
+            np.add.at(folded, N - 1 - degrees, array)
+            array = folded
+        self.array = array
+        self.N = N
+
+    @classmethod
+    def from_list(cls, coefficients: list, N: int):
+        return cls(_as_pairs(coefficients), N)
+
+    @classmethod
+    def from_polynomial(cls, poly, N: int):
+        '''Lift an EisensteinPolynomial or EisensteinArrayPolynomial into the ring'''
+        if isinstance(poly, EisensteinRingElement) and poly.N == N:
+            return poly
+        if isinstance(poly, EisensteinArrayPolynomial):
+            return cls(poly.array, N)
+        return cls.from_list(poly.coefficients, N)
+
+    @functools.cached_property
+    def matrix(self) -> np.ndarray:
+        '''(2, N, N) ring matrix, built once and reused by every product with this element'''
+        return _ring_matrix(self.array)
+
+    @functools.cached_property
+    def _float_matrix(self) -> np.ndarray:
+        return self.matrix.astype(np.float64)
+
+    @functools.cached_property
+    def _max_abs(self) -> int:
+        return int(np.abs(self.array).max(initial=0))
+
+    def precompute(self):
+        '''Build the ring matrices now instead of at the first product'''
+        self._float_matrix
+        return self
+
+    @property
+    def precomputed(self) -> bool:
+        return '_float_matrix' in self.__dict__
+
+    def apply(self, a: np.ndarray) -> np.ndarray:
+        '''
+        Multiply a (..., N, 2) coefficient array, or a stack of them, by this element.
+        Uses the BLAS float64 product when it is exact, the int64 product otherwise.
+        '''
+        bound = 3 * self.N * self._max_abs * int(np.abs(a).max(initial=0))
+        matrix = self._float_matrix if bound < _FLOAT_EXACT else self.matrix
+        return _ring_mul(matrix, a)
+
+    def __add__(self, other):
+        if isinstance(other, EisensteinArrayPolynomial):
+            return EisensteinRingElement(self.array + EisensteinRingElement.from_polynomial(other, self.N).array,
+                                         self.N)
+        return NotImplemented
+
+    def __neg__(self):
+        return EisensteinRingElement(-self.array, self.N)
+
+    def __sub__(self, other):
+        if isinstance(other, EisensteinArrayPolynomial):
+            return self + (-other)
+        return NotImplemented
+
+    def __mul__(self, other):
+        if isinstance(other, EisensteinArrayPolynomial):
+            other = EisensteinRingElement.from_polynomial(other, self.N)
+            return EisensteinRingElement(other.apply(self.array), self.N)
+        product = EisensteinArrayPolynomial.__mul__(self, other)
+        if product is NotImplemented:
+            return NotImplemented
+        return EisensteinRingElement(product.array, self.N)
+
+    def __mod__(self, other):
+        if isinstance(other, (int, EisensteinElement)):
+            return EisensteinRingElement(EisensteinArrayPolynomial.__mod__(self, other).array, self.N)
+        raise TypeError("Unsupported operand type for %")
+
+
+if __name__ == "__main__":
+    fpoly = EisensteinPolynomial([EisensteinElement(5, 17), EisensteinElement(8, 3), EisensteinElement(-1, 0)])
+    gpoly = EisensteinPolynomial([EisensteinElement(1, 0), EisensteinElement(0, 0), EisensteinElement(-1, -1)])
+    farr = EisensteinArrayPolynomial.from_polynomial(fpoly)
+    garr = EisensteinArrayPolynomial.from_polynomial(gpoly)
+    q = EisensteinElement(2, 3)
+    print(f"f*g = {farr * garr}")
+    print(f"f*g % q = {(farr * garr) % q}")
+    print(f"same as list form: {((fpoly * gpoly) % q).coefficients == ((farr * garr) % q).coefficients}")
+    fring = EisensteinRingElement.from_polynomial(fpoly, 2)
+    gring = EisensteinRingElement.from_polynomial(gpoly, 2)
+    print(f"f*g mod x^2-1 = {fring * gring}")
@@ -0,0 +1,146 @@
+'''
+Finite field structure of Z[ω]/(π) for a prime π of Z[ω], used for fast inversion in (Z[ω]/π)[x]/(x^N - 1).
+If d(π) is a rational prime l, Z[ω]/π ≅ F_l with ω ↦ -a/b (mod l), e.g. p = 2 + 3ω gives F_7.
+If π is an associate of a rational prime l ≡ 2 (mod 3), Z[ω]/π ≅ F_l[ω]/(ω^2 + ω + 1), e.g. q = 167ω gives F_{167^2}.
+Field elements are stored as (..., 2) int64 arrays (a, b) = a + bω with 0 <= a, b < l, b = 0 in the first case.
+'''
+import functools
+
+import numpy as np
+
+from Eisenstein import EisensteinElement, is_prime
+from EisensteinArray import cvp_mod
+
+
+def _trim(poly: np.ndarray) -> np.ndarray:
+    '''Remove highest degree zero coefficients of a polynomial lowest degree first'''
+    nonzero = np.flatnonzero(poly.any(axis=1))
+    if nonzero.size == 0:
+        return poly[:0]
+    return poly[:nonzero[-1] + 1]
+
+
+class EisensteinField():
+    def __init__(self, module: EisensteinElement):
+        norm = module.norm
+        content = np.gcd(module.x, module.y)
+        if norm > 1 and is_prime(norm):
+            # split or ramified prime: ω ↦ theta, the root of x^2 + x + 1 with a + b*theta = 0 (mod l)
+            self.l = norm
+            self.theta = (-module.x * pow(module.y, -1, norm)) % norm
+        elif content > 1 and norm == content ** 2 and content % 3 == 2 and is_prime(content):
+            # module is a unit times an inert rational prime
+            self.l = int(content)
+            self.theta = None
+        else:
+            raise ValueError(f"{module} is not a prime of Z[ω], Z[ω]/({module}) is not a field")
+        self.module = module
+
+    def to_field(self, a: np.ndarray) -> np.ndarray:
+        '''Map (..., 2) Eisenstein coefficients to field elements'''
+        if self.theta is None:
+            return a % self.l
+        field = np.zeros_like(a)
+        field[..., 0] = (a[..., 0] + a[..., 1] * self.theta) % self.l
+        return field
+
+    def to_eisenstein(self, a: np.ndarray) -> np.ndarray:
+        '''Map field elements back to their canonical representatives, the same as EisensteinElement % module'''
+        return cvp_mod(a, self.module)
+
+    def mul(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        x = a[..., 0] * b[..., 0] - a[..., 1] * b[..., 1]
+        y = a[..., 0] * b[..., 1] + a[..., 1] * b[..., 0] - a[..., 1] * b[..., 1]
+        return np.stack((x, y), axis=-1) % self.l
+
+    def inv(self, a: np.ndarray) -> np.ndarray:
+        '''a^-1 = conjugate(a) / norm(a), the norm is zero only for a = 0'''
+        x, y = int(a[0]), int(a[1])
+        norm = (x * x - x * y + y * y) % self.l
+        if norm == 0:
+            raise ZeroDivisionError("0 has no inverse")
+        inverse = pow(norm, -1, self.l)
+        return np.array([(x - y) * inverse % self.l, -y * inverse % self.l], dtype=np.int64)
+
+    def poly_mul(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        '''Product of polynomials over the field, coefficients lowest degree first'''
+        if len(a) == 0 or len(b) == 0:
+            return a[:0]
+        bd = np.convolve(a[:, 1], b[:, 1])
+        x = np.convolve(a[:, 0], b[:, 0]) - bd
+        y = np.convolve(a[:, 0], b[:, 1]) + np.convolve(a[:, 1], b[:, 0]) - bd
+        return np.stack((x, y), axis=-1) % self.l
+
+    def poly_sub(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        result = np.zeros((max(len(a), len(b)), 2), dtype=np.int64)
+        result[:len(a)] += a
+        result[:len(b)] -= b
+        return _trim(result % self.l)
+
+    def poly_divmod(self, a: np.ndarray, b: np.ndarray):
+        '''Long division over the field, coefficients lowest degree first, b nonzero'''
+        remainder = a.copy()
+        quotient = np.zeros((max(len(a) - len(b) + 1, 1), 2), dtype=np.int64)
+        lead_inverse = self.inv(b[-1])
+        while len(remainder) >= len(b):
+            shift = len(remainder) - len(b)
+            factor = self.mul(remainder[-1], lead_inverse)
+            quotient[shift] = factor
+            remainder[shift:] = (remainder[shift:] - self.mul(factor, b)) % self.l
+            remainder = _trim(remainder)
+        return _trim(quotient), remainder
+
+    def invert_polynomial(self, coefficients: np.ndarray, N: int) -> np.ndarray:
+        '''
+        Inverse of a polynomial in (Z[ω]/module)[x]/(x^N - 1) by extended Euclid over the field.
+        Input and output are (N, 2) Eisenstein coefficients, highest degree first
+        '''
+        modulus = np.zeros((N + 1, 2), dtype=np.int64)
+        modulus[0, 0] = self.l - 1
+        modulus[N, 0] = 1
+        r0, r1 = modulus, _trim(self.to_field(coefficients[::-1]))
+        t0, t1 = np.zeros((0, 2), dtype=np.int64), np.array([[1, 0]], dtype=np.int64)
+        while len(r1) > 1:
+            quotient, remainder = self.poly_divmod(r0, r1)
+            r0, r1 = r1, remainder
+            t0, t1 = t1, self.poly_sub(t0, self.poly_mul(quotient, t1))
+        if len(r1) == 0:
+            raise ZeroDivisionError(f"Polynomial has no inverse in mod {self.module}")
+        inverse = self.mul(t1, self.inv(r1[0]))
+        result = np.zeros((N, 2), dtype=np.int64)
+        result[:len(inverse)] = inverse
+        return self.to_eisenstein(result[::-1])
+
+
+@functools.lru_cache(maxsize=None)
+def field(x: int, y: int) -> EisensteinField:
+    '''Shared EisensteinField of the module x + yω, raises ValueError if it is not a field'''
+    return EisensteinField(EisensteinElement(x, y))
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from classETRU import ETRU
+    from EisensteinArray import EisensteinRingElement
+    from EisensteinPolynomial import EisensteinPolynomial
+
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 251
+    etru = ETRU(N, EisensteinElement(2, 3), EisensteinElement(0, 167))
+    etru.generate_random_keys()
+    # f is kept as a UnitPolynomial, Euclid works on EisensteinPolynomial
+    f_poly = etru.ring(etru.f_poly).to_polynomial()
+    while not f_poly.coefficients[0]:
+        # the Euclid path needs a nonzero leading coefficient
+        f_poly = EisensteinPolynomial(f_poly.coefficients[1:])
+    for module in (etru.p, etru.q):
+        start = time.perf_counter()
+        euclid = f_poly.invert(mod=etru.R_poly, module=module)
+        euclid_time = time.perf_counter() - start
+        start = time.perf_counter()
+        fast = field(module.x, module.y).invert_polynomial(etru.ring(etru.f_poly).array, N)
+        fast_time = time.perf_counter() - start
+        same = EisensteinRingElement.from_polynomial(euclid, N).array.tolist() == fast.tolist()
+        print(f"N={N} invert mod {module}: Euclid {euclid_time:.3f} s, field {fast_time:.3f} s, "
+              f"speedup {euclid_time / fast_time:.0f}x, same result: {same}")
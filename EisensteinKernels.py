@@ -0,0 +1,73 @@
+'''
+Native ring kernels of the helpers extension: ring products, reduction modulo p and q and whole batches of
+encryption and decryption over (B, N, 2) int64 arrays, computed in C++ without the GIL, so that threads such as
+those of ETRUServer run them in parallel.
+kernels is the helpers module if it was built with the kernels of KERNEL_VERSION, otherwise None and the
+callers keep to their NumPy paths. Both give the same results while the coefficients stay below 2^40, as those of
+keys, messages and cipher texts do, beyond that the NumPy paths overflow int64 as well. ETRU_NATIVE=0 turns the
+kernels off.
+'''
+import os
+
+import numpy as np
+
+try:
+    import helpers
+except ImportError:
+    helpers = None
+
+KERNEL_VERSION = 1
+
+# a helpers module built from an older or newer helpers.cpp is ignored
+kernels = helpers if getattr(helpers, 'KERNEL_VERSION', None) == KERNEL_VERSION else None
+if os.environ.get('ETRU_NATIVE', '1') == '0':
+    kernels = None
+
+
+def available() -> bool:
+    return kernels is not None
+
+
+def ring_multiply(blocks: np.ndarray, key: np.ndarray) -> np.ndarray:
+    '''(..., N, 2) blocks times a (N, 2) key in Z[ω][x]/(x^N - 1)'''
+    return kernels.ring_multiply(np.asarray(blocks, dtype=np.int64), np.asarray(key, dtype=np.int64))
+
+
+def reduce(a: np.ndarray, module) -> np.ndarray:
+    '''Same as cvp_mod(a, module)'''
+    return kernels.reduce(np.asarray(a, dtype=np.int64), module.x, module.y)
+
+
+def encrypt_batch(msg_blocks: np.ndarray, rand_blocks: np.ndarray, ph: np.ndarray, q) -> np.ndarray:
+    '''(r * p*h + m) mod q of every block'''
+    return kernels.encrypt_batch(np.asarray(msg_blocks, dtype=np.int64), np.asarray(rand_blocks, dtype=np.int64),
+                                 ph, q.x, q.y)
+
+
+def decrypt_batch(cipher_blocks: np.ndarray, f: np.ndarray, f_p: np.ndarray, p, q) -> np.ndarray:
+    '''(f_p * ((f * e) mod q)) mod p of every block, f_p None for the private keys f = 1 + p*F'''
+    if f_p is None:
+        f_p = np.empty((0, 2), dtype=np.int64)
+    return kernels.decrypt_batch(np.asarray(cipher_blocks, dtype=np.int64), f, f_p, p.x, p.y, q.x, q.y)
+
+
+if __name__ == "__main__":
+    import time
+
+    from Eisenstein import EisensteinElement
+    from EisensteinArray import cvp_mod
+    from EisensteinMultiplier import Multiplier
+
+    if kernels is None:
+        raise SystemExit("helpers has no ring kernels, build it with runme.sh")
+    rng = np.random.default_rng(0)
+    N, q = 251, EisensteinElement(0, 167)
+    blocks = rng.integers(-1, 2, size=(64, N, 2))
+    key = rng.integers(-83, 84, size=(N, 2))
+    start = time.perf_counter()
+    native = ring_multiply(blocks, key)
+    elapsed = time.perf_counter() - start
+    expected = np.array([Multiplier().ring_multiply(block, key, N) for block in blocks])
+    print(f"64 ring products of N={N}: {elapsed * 1000:.3f} ms, same result: {np.array_equal(native, expected)}")
+    a = rng.integers(-10 ** 6, 10 ** 6, size=(100000, 2))
+    print(f"reduction mod {q}, same result: {np.array_equal(reduce(a, q), cvp_mod(a, q))}")
@@ -0,0 +1,190 @@
+'''
+Multiplication engine of Eisenstein Polynomials stored as (len, 2) arrays of (x, y) pairs.
+Strategies: schoolbook (np.convolve), Karatsuba, and exact NTT over two primes joined by CRT.
+Ring products with an operand of units only can use rotate-and-add instead, see EisensteinSparse.py.
+An Eisenstein product a*b = (ac - bd) + (ad + bc - bd)ω takes three integer convolutions.
+'''
+import functools
+
+import numpy as np
+
+from EisensteinSparse import is_unit_array, unit_ring_multiply
+
+BACKENDS = ('auto', 'schoolbook', 'karatsuba', 'ntt', 'sparse')
+
+# NTT primes p = k * 2^m + 1 with a primitive root g, p < 2^31 so that products fit in int64
+_NTT_PRIMES = ((2013265921, 31), (469762049, 3))
+_NTT_MODULUS = _NTT_PRIMES[0][0] * _NTT_PRIMES[1][0]
+_NTT_MAX_SIZE = 1 << 26
+
+
+def _karatsuba(a: np.ndarray, b: np.ndarray, threshold: int) -> np.ndarray:
+    '''Linear convolution of two integer arrays, schoolbook below threshold'''
+    if min(len(a), len(b)) <= threshold:
+        return np.convolve(a, b)
+    size = len(a) + len(b) - 1
+    m = (max(len(a), len(b)) + 1) // 2
+    a = np.concatenate((a, np.zeros(2 * m - len(a), dtype=a.dtype)))
+    b = np.concatenate((b, np.zeros(2 * m - len(b), dtype=b.dtype)))
+    z0 = _karatsuba(a[:m], b[:m], threshold)
+    z2 = _karatsuba(a[m:], b[m:], threshold)
+    z1 = _karatsuba(a[:m] + a[m:], b[:m] + b[m:], threshold)
+    z1[:len(z0)] -= z0
+    z1[:len(z2)] -= z2
+    result = np.zeros(4 * m - 1, dtype=z1.dtype)
+    result[:len(z0)] += z0
+    result[m:m + len(z1)] += z1
+    result[2 * m:2 * m + len(z2)] += z2
+    return result[:size]
+
+
+@functools.lru_cache(maxsize=None)
+def _bit_reverse(n: int) -> np.ndarray:
+    bits = n.bit_length() - 1
+    index = np.arange(n)
+    reverse = np.zeros(n, dtype=np.int64)
+    for i in range(bits):
+        reverse |= ((index >> i) & 1) << (bits - 1 - i)
+    return reverse
+
+
+@functools.lru_cache(maxsize=None)
+def _twiddles(n: int, prime: int, root: int, inverse: bool) -> np.ndarray:
+    '''Powers w^0 .. w^(n/2 - 1) of a primitive n-th root of unity mod prime'''
+    w = pow(root, (prime - 1) // n, prime)
+    if inverse:
+        w = pow(w, prime - 2, prime)
+    table = np.ones(max(n // 2, 1), dtype=np.int64)
+    for i in range(1, n // 2):
+        table[i] = table[i - 1] * w % prime
+    return table
+
+
+def _ntt(a: np.ndarray, prime: int, root: int, inverse=False) -> np.ndarray:
+    '''Iterative radix-2 number theoretic transform of a power-of-two length array in [0, prime)'''
+    n = len(a)
+    table = _twiddles(n, prime, root, inverse)
+    a = a[_bit_reverse(n)]
+    length = 2
+    while length <= n:
+        half = length // 2
+        w = table[::n // length][:half]
+        a = a.reshape(-1, length)
+        u = a[:, :half]
+        v = a[:, half:] * w % prime
+        a = np.concatenate(((u + v) % prime, (u - v) % prime), axis=1)
+        length *= 2
+    a = a.reshape(n)
+    if inverse:
+        a = a * pow(n, prime - 2, prime) % prime
+    return a
+
+
+def _ntt_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    '''Eisenstein product of (len, 2) arrays through NTT, exact when _ntt_fits(a, b)'''
+    size = len(a) + len(b) - 1
+    n = 1 << (size - 1).bit_length()
+    residues = []
+    for prime, root in _NTT_PRIMES:
+        fa = [_ntt(np.pad(a[:, i] % prime, (0, n - len(a))), prime, root) for i in (0, 1)]
+        fb = [_ntt(np.pad(b[:, i] % prime, (0, n - len(b))), prime, root) for i in (0, 1)]
+        bd = fa[1] * fb[1] % prime
+        x = (fa[0] * fb[0] - bd) % prime
+        y = (fa[0] * fb[1] % prime + fa[1] * fb[0] % prime - bd) % prime
+        residues.append([_ntt(x, prime, root, inverse=True)[:size], _ntt(y, prime, root, inverse=True)[:size]])
+    # Garner's CRT over the two primes, then map to the symmetric range
+    (p1, _), (p2, _) = _NTT_PRIMES
+    inverse_p1 = pow(p1, p2 - 2, p2)
+    result = np.empty((size, 2), dtype=np.int64)
+    for i in (0, 1):
+        r1, r2 = residues[0][i], residues[1][i]
+        value = r1 + p1 * ((r2 - r1) % p2 * inverse_p1 % p2)
+        result[:, i] = np.where(value > _NTT_MODULUS // 2, value - _NTT_MODULUS, value)
+    return result
+
+
+def _ntt_fits(a: np.ndarray, b: np.ndarray) -> bool:
+    '''Whether every coefficient of a*b is guaranteed to lie in the CRT range'''
+    if a.dtype == object or b.dtype == object or len(a) + len(b) > _NTT_MAX_SIZE:
+        return False
+    bound = 3 * min(len(a), len(b)) * int(np.abs(a).max(initial=0)) * int(np.abs(b).max(initial=0))
+    return bound < _NTT_MODULUS // 2
+
+
+def _fold(product: np.ndarray, N: int) -> np.ndarray:
+    '''Reduce a product highest degree first modulo x^N - 1'''
+    pad = -len(product) % N
+    product = np.concatenate((np.zeros((pad, 2), dtype=product.dtype), product))
+    return product.reshape(-1, N, 2).sum(axis=0)
+
+
+class Multiplier():
+    '''
+    Multiplication engine with a selectable backend.
+    'auto' picks schoolbook below karatsuba_threshold, NTT from ntt_threshold on, Karatsuba in between.
+    Karatsuba recursion falls back to schoolbook at base_size.
+    'auto' and 'sparse' multiply in the ring by rotate-and-add when an operand has only 0 and unit coefficients,
+    'sparse' does so at every size, products of other operands take the strategy of 'auto'.
+    '''
+
+    def __init__(self, backend='auto', karatsuba_threshold=2048, ntt_threshold=4096, base_size=64):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown multiplication backend {backend}, choose from {BACKENDS}")
+        self.backend = backend
+        self.karatsuba_threshold = karatsuba_threshold
+        self.ntt_threshold = ntt_threshold
+        self.base_size = base_size
+
+    def strategy(self, size: int) -> str:
+        if self.backend != 'auto':
+            return self.backend
+        return self._dense_strategy(size)
+
+    def _dense_strategy(self, size: int) -> str:
+        '''Strategy of 'auto' for operands that aren't sparse'''
+        if size < self.karatsuba_threshold:
+            return 'schoolbook'
+        if size < self.ntt_threshold:
+            return 'karatsuba'
+        return 'ntt'
+
+    def multiply(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        '''Full product of two (len, 2) Eisenstein coefficient arrays'''
+        if len(a) == 0 or len(b) == 0:
+            return a[:0]
+        strategy = self.strategy(min(len(a), len(b)))
+        if strategy == 'sparse':
+            strategy = self._dense_strategy(min(len(a), len(b)))
+        if strategy == 'ntt' and _ntt_fits(a, b):
+            return _ntt_multiply(a, b)
+        if strategy == 'schoolbook':
+            convolve = np.convolve
+        else:
+            convolve = functools.partial(_karatsuba, threshold=self.base_size)
+        p = convolve(a[:, 0], b[:, 0])
+        q = convolve(a[:, 1], b[:, 1])
+        r = convolve(a[:, 0] + a[:, 1], b[:, 0] + b[:, 1])
+        return np.stack((p - q, r - p - 2 * q), axis=-1)
+
+    def ring_multiply(self, a: np.ndarray, b: np.ndarray, N: int) -> np.ndarray:
+        '''Product of two (N, 2) arrays in Z[ω][x]/(x^N - 1)'''
+        if self.backend in ('auto', 'sparse') and (is_unit_array(a) or is_unit_array(b)):
+            return unit_ring_multiply(a, b, N)
+        return _fold(self.multiply(a, b), N)
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    for N in (251, 1021, 4093):
+        a = rng.integers(-200, 200, size=(N, 2))
+        b = rng.integers(-1, 2, size=(N, 2))
+        expected = None
+        for backend in BACKENDS[1:]:
+            multiplier = Multiplier(backend)
+            start = time.perf_counter()
+            result = multiplier.ring_multiply(a, b, N)
+            elapsed = time.perf_counter() - start
+            expected = result if expected is None else expected
+            print(f"N={N} {backend:>10}: {elapsed * 1000:8.2f} ms, same result: {np.array_equal(result, expected)}")
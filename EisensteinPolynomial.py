@@ -2,10 +2,10 @@
 Definition of Eisenstein Polynomial. Polynomial which coefficients are all Eisenstein Integers.
 
 '''
-from Eisenstein import EisensteinElement
+from Eisenstein import ONE, ZERO, EisensteinElement, mul_add
 
-zero = EisensteinElement(0, 0)
-one = EisensteinElement(1, 0)
+zero = ZERO
+one = ONE
 
 
 def _extend_euclid(f, g, module):
@@ -16,10 +16,10 @@ def _extend_euclid(f, g, module):
     '''
     h = f
     l = g
-    u = EisensteinPolynomial([EisensteinElement(0, 0)])
-    v = EisensteinPolynomial([EisensteinElement(1, 0)])
-    a = EisensteinPolynomial([EisensteinElement(1, 0)])
-    b = EisensteinPolynomial([EisensteinElement(0, 0)])
+    u = EisensteinPolynomial([zero])
+    v = EisensteinPolynomial([one])
+    a = EisensteinPolynomial([one])
+    b = EisensteinPolynomial([zero])
     while bool(l):
         q, r = _divmod(h, l,module)  # q=h//q,r=h%l
         h = l
@@ -107,12 +107,15 @@ class EisensteinPolynomial():
             degree_self = len(self.coefficients) - 1
             degree_other = len(other.coefficients) - 1
             degree_result = degree_self + degree_other
-            coefficients = [EisensteinElement(0, 0)] * (degree_result + 1)
+            coefficients = [zero] * (degree_result + 1)
 
             for i in range(degree_self + 1):
+                coeff = self.coefficients[i]
+                # f, g and r are mostly zeros
+                if not coeff:
+                    continue
                 for j in range(degree_other + 1):
-                    product = self.coefficients[i] * other.coefficients[j]
-                    coefficients[i + j] += product
+                    coefficients[i + j] = mul_add(coefficients[i + j], coeff, other.coefficients[j])
 
             return EisensteinPolynomial(coefficients)
 
@@ -153,6 +156,8 @@ class EisensteinPolynomial():
 
 
 def _divmod(self: EisensteinPolynomial, other: EisensteinPolynomial, module: EisensteinElement = None):
+    # imported here, EisensteinResidues depends on this module through EisensteinArray
+    from EisensteinResidues import residues
     if not isinstance(other, EisensteinPolynomial): return NotImplemented
     #if other.coefficients[0] != one: return NotImplemented
     dividend_coeffs = self.coefficients
@@ -165,23 +170,26 @@ def _divmod(self: EisensteinPolynomial, other: EisensteinPolynomial, module: Eis
     quotient_coeffs = [zero] * (len(dividend_coeffs) - len(divisor_coeffs) + 1)
     remainder_coeffs = dividend_coeffs.copy()
 
+    # Reduction and inversion mod module are table lookups, the divisor's leading coefficient is inverted once
+    context = residues(module.x, module.y)
+    if len(remainder_coeffs) >= len(divisor_coeffs):
+        divisor_leading_inverse = context.invert_element(divisor_coeffs[0])
+
     # Perform long division algorithm
     while len(remainder_coeffs) >= len(divisor_coeffs):
-        # Get the leading terms of the dividend and divisor
+        # Get the leading term of the dividend
         dividend_leading = remainder_coeffs[0]
-        divisor_leading = divisor_coeffs[0]
 
         # Compute the quotient of leading terms
         # quotient_leading = dividend_leading / divisor_leading
-        quotient_leading = dividend_leading * divisor_leading.invert(mod=module)
+        quotient_leading = dividend_leading * divisor_leading_inverse
 
         # Add the quotient to the quotient list
         quotient_coeffs[len(divisor_coeffs) - len(remainder_coeffs) - 1] = quotient_leading
 
         # Multiply the divisor by the quotient and subtract from the dividend
         for i in range(len(divisor_coeffs)):
-            remainder_coeffs[i] -= quotient_leading * divisor_coeffs[i]
-            remainder_coeffs[i] = remainder_coeffs[i] % module
+            remainder_coeffs[i] = context.mul_sub_element(remainder_coeffs[i], quotient_leading, divisor_coeffs[i])
 
         # Remove leading zeros in the remainder
         while len(remainder_coeffs) > 0 and remainder_coeffs[0] == zero:
@@ -0,0 +1,138 @@
+'''
+Residue system of Z[ω]/(module) with precomputed lookup tables, for small moduli such as p (7 residues)
+and q (27889 residues). Reduction and inversion become table lookups.
+Residue classes are indexed through the Hermite normal form of the lattice module*Z[ω]: it has a basis
+(A, 0), (X, g) with A*g = d(module), so (x, y) is in class (y mod g) * A + (x - (y // g) * X) mod A.
+Moduli with more than MAX_TABLE_SIZE residues are not tabulated, the context then computes directly.
+'''
+import functools
+import math
+
+import numpy as np
+
+import EisensteinKernels
+from Eisenstein import EisensteinElement, interned
+from EisensteinArray import cvp_mod, mul, norm
+
+MAX_TABLE_SIZE = 1 << 20
+
+
+class EisensteinResidues():
+    def __init__(self, module: EisensteinElement):
+        if not module:
+            raise ZeroDivisionError("Residue system of 0")
+        # module and module*ω generate the lattice: (a, b) and (-b, a - b)
+        a, b = module.x, module.y
+        g, u, w = _extended_gcd(b, a - b)
+        self.module = module
+        self.size = module.norm
+        self.g = g
+        self.A = self.size // g
+        self.X = (u * a - w * b) % self.A
+        self.tabulated = self.size <= MAX_TABLE_SIZE
+        if not self.tabulated:
+            return
+        representatives = np.stack((np.arange(self.size) % self.A, np.arange(self.size) // self.A), axis=-1)
+        self.residues = cvp_mod(representatives, module)
+        self.one = int(self.index(np.array([1, 0])))
+
+    def index(self, a: np.ndarray) -> np.ndarray:
+        '''Residue class indices of a (..., 2) array'''
+        k = a[..., 1] // self.g
+        return (a[..., 1] - k * self.g) * self.A + (a[..., 0] - k * self.X) % self.A
+
+    def reduce(self, a: np.ndarray, native=False) -> np.ndarray:
+        '''
+        Canonical representatives of a (..., 2) array, same as cvp_mod(a, module).
+        native runs it in the native kernel of helpers if there is one, callers pass the choice of their backend.
+        '''
+        if native and EisensteinKernels.available():
+            return EisensteinKernels.reduce(a, self.module)
+        if not self.tabulated:
+            return cvp_mod(a, self.module)
+        return self.residues[self.index(a)]
+
+    @functools.cached_property
+    def inverses(self) -> np.ndarray:
+        '''Index of the inverse of every residue class, -1 if it has none'''
+        # α^-1 = α' * d(α)^-1 when d(α) is invertible modulo d(module), α' = x + yω^2 = (x - y) - yω
+        norms = norm(self.residues) % self.size
+        scale = np.array([pow(int(n), -1, self.size) if math.gcd(int(n), self.size) == 1 else 0 for n in norms],
+                         dtype=np.int64)
+        x, y = self.residues[:, 0], self.residues[:, 1]
+        candidates = self.index(np.stack((x - y, -y), axis=-1) * scale[:, None] % self.size)
+        product = self.index(mul(self.residues, self.residues[candidates]))
+        inverses = np.where(product == self.one, candidates, -1)
+        # the remaining classes need the Euclid algorithm, e.g. residues divisible by the conjugate of module
+        for i in np.flatnonzero(inverses < 0):
+            element = self.elements[i]
+            try:
+                inverses[i] = self.index(np.array(_coordinates(element.invert(mod=self.module))))
+            except ZeroDivisionError:
+                pass
+        return inverses
+
+    @functools.cached_property
+    def elements(self) -> list:
+        '''Canonical representatives as shared EisensteinElement instances, small ones are the interned instances'''
+        return [interned(x, y) for x, y in self.residues.tolist()]
+
+    def element_index(self, element: EisensteinElement) -> int:
+        k = element.y // self.g
+        return (element.y - k * self.g) * self.A + (element.x - k * self.X) % self.A
+
+    def reduce_element(self, element: EisensteinElement) -> EisensteinElement:
+        '''Same as element % module'''
+        if not self.tabulated:
+            return element % self.module
+        return self.elements[self.element_index(element)]
+
+    def mul_sub_element(self, a: EisensteinElement, b: EisensteinElement, c: EisensteinElement) -> EisensteinElement:
+        '''Same as (a - b*c) % module, without intermediate elements'''
+        x = a.x - b.x * c.x + b.y * c.y
+        y = a.y - b.x * c.y - b.y * c.x + b.y * c.y
+        if not self.tabulated:
+            return EisensteinElement(x, y) % self.module
+        k = y // self.g
+        return self.elements[(y - k * self.g) * self.A + (x - k * self.X) % self.A]
+
+    def invert_element(self, element: EisensteinElement) -> EisensteinElement:
+        '''Canonical representative of element.invert(mod=module)'''
+        if not self.tabulated:
+            return element.invert(mod=self.module) % self.module
+        inverse = self.inverses[self.element_index(element)]
+        if inverse < 0:
+            raise ZeroDivisionError(f"{element} has no inverse in mod {self.module}")
+        return self.elements[inverse]
+
+
+def _coordinates(element: EisensteinElement) -> list:
+    return [element.x, element.y]
+
+
+def _extended_gcd(a: int, b: int):
+    '''g, u, w with u*a + w*b = g = gcd(a, b) >= 0'''
+    u0, w0, u1, w1 = 1, 0, 0, 1
+    while b:
+        quotient = a // b
+        a, b = b, a - quotient * b
+        u0, u1 = u1, u0 - quotient * u1
+        w0, w1 = w1, w0 - quotient * w1
+    if a < 0:
+        return -a, -u0, -w0
+    return a, u0, w0
+
+
+@functools.lru_cache(maxsize=None)
+def residues(x: int, y: int) -> EisensteinResidues:
+    '''Residue system of the module x + yω, built once and shared by every caller'''
+    return EisensteinResidues(EisensteinElement(x, y))
+
+
+if __name__ == "__main__":
+    for module in (EisensteinElement(2, 3), EisensteinElement(0, 167)):
+        context = residues(module.x, module.y)
+        units = int((context.inverses >= 0).sum())
+        print(f"Z[ω]/({module}): {context.size} residues, {units} invertible")
+        element = EisensteinElement(5, 17)
+        print(f"{element} % module = {context.reduce_element(element)}, inverse = {context.invert_element(element)}")
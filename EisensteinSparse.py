@@ -0,0 +1,127 @@
+'''
+Sparse unit polynomials of Z[ω][x]/(x^N - 1): every coefficient is 0 or one of the six units ±1, ±ω, ±ω^2,
+like f, g and the blinding polynomial r. They are stored as the degrees of the coefficients of each unit.
+A product with a unit only permutes and negates the coordinates, so a ring product is one rotation of the
+other operand per nonzero coefficient, added up per unit, and three unit transforms at the end.
+'''
+import functools
+
+import numpy as np
+
+from Eisenstein import interned
+from EisensteinArray import EisensteinRingElement
+
+# the units in the order of RP_ELEMENTS, ω^2 = -1 - ω
+UNITS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1))
+# unit -> (power of ω, sign), 1 + ω = -ω^2
+_POWERS = {(1, 0): (0, 1), (-1, 0): (0, -1), (0, 1): (1, 1), (0, -1): (1, -1), (-1, -1): (2, 1), (1, 1): (2, -1)}
+
+
+def is_unit_array(array: np.ndarray) -> bool:
+    '''Whether every coefficient of a (..., 2) array is 0 or a unit'''
+    x, y = array[..., 0], array[..., 1]
+    return bool(np.all(((np.abs(x) <= 1) & (np.abs(y) <= 1) & (x != -y)) | ((x == 0) & (y == 0))))
+
+
+class UnitPolynomial():
+    def __init__(self, degrees: dict, N: int):
+        '''degrees: unit (x, y) -> int array of the degrees whose coefficient is that unit'''
+        self.degrees = {unit: np.asarray(degrees[unit], dtype=np.int64) for unit in UNITS if unit in degrees}
+        self.N = N
+
+    @classmethod
+    def from_array(cls, array: np.ndarray):
+        '''From N coefficients highest degree first, raises ValueError if one isn't 0 or a unit'''
+        array = np.asarray(array, dtype=np.int64).reshape(-1, 2)
+        if not is_unit_array(array):
+            raise ValueError("Coefficients must be 0 or units")
+        N = len(array)
+        degrees = {}
+        for unit in UNITS:
+            index = np.flatnonzero((array[:, 0] == unit[0]) & (array[:, 1] == unit[1]))
+            if index.size:
+                degrees[unit] = N - 1 - index
+        return cls(degrees, N)
+
+    @classmethod
+    def from_list(cls, coefficients: list, N: int):
+        return cls.from_array(EisensteinRingElement.from_list(coefficients, N).array)
+
+    @classmethod
+    def from_polynomial(cls, poly, N: int):
+        '''From an EisensteinPolynomial or EisensteinArrayPolynomial, folded into the ring'''
+        return cls.from_array(EisensteinRingElement.from_polynomial(poly, N).array)
+
+    @functools.cached_property
+    def array(self) -> np.ndarray:
+        '''(N, 2) coefficients, highest degree first'''
+        array = np.zeros((self.N, 2), dtype=np.int64)
+        for unit, degrees in self.degrees.items():
+            array[self.N - 1 - degrees] = unit
+        return array
+
+    @property
+    def coefficients(self) -> list:
+        return [interned(x, y) for x, y in self.array.tolist()]
+
+    @property
+    def weight(self) -> int:
+        return sum(len(degrees) for degrees in self.degrees.values())
+
+    def __str__(self):
+        return self.to_ring().__str__()
+
+    def to_ring(self) -> EisensteinRingElement:
+        return EisensteinRingElement(self.array, self.N)
+
+    def apply(self, a: np.ndarray) -> np.ndarray:
+        '''
+        Multiply a (..., N, 2) coefficient array, or a stack of them, by this polynomial with additions only.
+        x^d * a is a rotation of a by d positions, a window of a written out twice.
+        '''
+        a = np.asarray(a, dtype=np.int64)
+        N = self.N
+        doubled = np.concatenate((a, a), axis=-2)
+        # sums[k] = sum of the rotations of a over the degrees of ±ω^k, signed
+        sums = [np.zeros_like(a) for _ in range(3)]
+        for unit, degrees in self.degrees.items():
+            power, sign = _POWERS[unit]
+            total = sums[power]
+            for d in degrees.tolist():
+                if sign > 0:
+                    total += doubled[..., d:d + N, :]
+                else:
+                    total -= doubled[..., d:d + N, :]
+        # s0 + ω*s1 + ω^2*s2, ω*(x, y) = (-y, x - y) and ω^2*(x, y) = (y - x, -x)
+        (x0, y0), (x1, y1), (x2, y2) = [(s[..., 0], s[..., 1]) for s in sums]
+        x = x0 - y1 + y2 - x2
+        y = y0 + x1 - y1 - x2
+        return np.stack((x, y), axis=-1)
+
+
+def unit_ring_multiply(a: np.ndarray, b: np.ndarray, N: int) -> np.ndarray:
+    '''Product of (N, 2) arrays in Z[ω][x]/(x^N - 1), by rotate-and-add over the operand of units'''
+    if is_unit_array(b):
+        return UnitPolynomial.from_array(b).apply(a)
+    return UnitPolynomial.from_array(a).apply(b)
+
+
+if __name__ == "__main__":
+    import time
+
+    from EisensteinMultiplier import Multiplier
+
+    rng = np.random.default_rng(0)
+    for N, weight in ((251, 84), (503, 200), (4093, 1364)):
+        a = rng.integers(-200, 200, size=(N, 2))
+        b = np.zeros((N, 2), dtype=np.int64)
+        b[rng.choice(N, weight, replace=False)] = np.array(UNITS)[rng.integers(0, 6, weight)]
+        units = UnitPolynomial.from_array(b)
+        start = time.perf_counter()
+        result = units.apply(a)
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        expected = Multiplier().ring_multiply(a, b, N)
+        dense = time.perf_counter() - start
+        print(f"N={N} weight={weight}: rotate-and-add {elapsed * 1000:8.2f} ms, dense {dense * 1000:8.2f} ms, "
+              f"same result: {np.array_equal(result, expected)}")
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+'''ETRU benchmark
+
+Times key generation, blinding, encryption, decryption, message encoding, hybrid mode and the CLI block mode for several
+parameter sets and input sizes, writes the results as JSON and compares them against a saved baseline.
+
+Usage:
+  benchmark.py [options]
+  benchmark.py (-h | --help)
+
+Options:
+  --params=LIST      Comma-separated parameter sets
+                       [default: etru107,etru251,etru251s,etru503].
+  --bytes=LIST       Comma-separated input sizes of block mode
+                       and block encoding [default: 1000,10000,100000].
+  --repeat=R         Timed runs per case [default: 20].
+  --cli-repeat=R     Timed runs per CLI case [default: 3].
+  --output=FILE      Write the results to FILE [default: benchmark.json].
+  --baseline=FILE    Compare the p50 latencies against the results in FILE.
+  --tolerance=T      Relative slowdown flagged as a regression [default: 0.25].
+  -h, --help         Show this screen.
+'''
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from docopt import docopt
+
+import etru
+import ETRUHybrid
+from classETRU import ETRU
+from EisensteinArray import EisensteinArrayPolynomial
+from ETRUParameters import DEFAULT, parameters
+from utils import decode_chunks, eisenstein_decode, eisenstein_encode, encode_chunks
+
+
+def summarize(times: list, peak_memory: int) -> dict:
+    times = np.array(times)
+    return {
+        'repeat': len(times),
+        'ops_per_s': float(len(times) / times.sum()),
+        'mean_ms': float(times.mean() * 1000),
+        'min_ms': float(times.min() * 1000),
+        'p50_ms': float(np.percentile(times, 50) * 1000),
+        'p90_ms': float(np.percentile(times, 90) * 1000),
+        'p99_ms': float(np.percentile(times, 99) * 1000),
+        'peak_memory_bytes': int(peak_memory),
+    }
+
+
+def measure(function, repeat: int, setup=None) -> dict:
+    '''
+    Time function(*setup()) repeat times, setup is not timed.
+    Peak memory is the tracemalloc peak of one more, untimed run, so tracing doesn't distort the timings.
+    '''
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    args = setup() if setup else ()
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return summarize(times, peak)
+
+
+def measure_process(command: list, input_file: str, repeat: int) -> dict:
+    '''
+    Time a command with its input from input_file, peak memory is the largest maximum RSS of the child.
+    Raises CalledProcessError if a run fails, its time would not be that of the work measured.
+    '''
+    times, peak = [], 0
+    for _ in range(repeat):
+        with open(input_file, 'rb') as stdin:
+            start = time.perf_counter()
+            process = subprocess.Popen(command, stdin=stdin, stdout=subprocess.DEVNULL)
+            _, status, usage = os.wait4(process.pid, 0)
+            times.append(time.perf_counter() - start)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, command)
+        peak = max(peak, usage.ru_maxrss * 1024)
+    return summarize(times, peak)
+
+
+def random_text(size: int) -> str:
+    return ''.join(random.choices('abcdefghijklmnopqrstuvwxyz ', k=size))
+
+
+def run(names: list, sizes: list, repeat: int, cli_repeat: int) -> dict:
+    results = {}
+
+    def record(name, result):
+        results[name] = result
+        print(f"{name:<36} p50 {result['p50_ms']:10.3f} ms  {result['ops_per_s']:10.1f} ops/s  "
+              f"peak {result['peak_memory_bytes'] / 1024:10.1f} KiB")
+
+    for name in names:
+        params = parameters(name)
+        record(f"keygen/{name}", measure(lambda: ETRU.from_parameters(params).generate_random_keys(),
+                                         max(repeat // 4, 1)))
+        context = ETRU.from_parameters(params)
+        context.generate_random_keys()
+        message = EisensteinArrayPolynomial.from_list(eisenstein_encode("I am Maozihao", params.N))
+        record(f"sample/{name}/blocks=256", measure(lambda: context.random_blinding_batch(256), repeat))
+        blinding = lambda: (context.random_blinding(),)
+        record(f"encrypt/{name}", measure(lambda r: context.encrypt(message, r), repeat, blinding))
+        cipher = context.encrypt(message, blinding()[0])
+        record(f"decrypt/{name}", measure(lambda: context.decrypt(cipher), repeat))
+
+    for size in (16, 64):
+        text = random_text(size)
+        encoded = eisenstein_encode(text)
+        record(f"eisenstein_encode/bytes={size}", measure(lambda: eisenstein_encode(text), repeat))
+        record(f"eisenstein_decode/bytes={size}", measure(lambda: eisenstein_decode(encoded), repeat))
+    n = parameters(DEFAULT).block_size
+    for size in sizes:
+        data = os.urandom(size)
+        digits = encode_chunks(data, n)
+        record(f"encode_chunks/bytes={size}", measure(lambda: encode_chunks(data, n), repeat))
+        record(f"decode_chunks/bytes={size}", measure(lambda: decode_chunks(digits), repeat))
+
+    with tempfile.TemporaryDirectory() as directory:
+        priv_key, pub_key = os.path.join(directory, 'key_priv.npz'), os.path.join(directory, 'key_pub.npz')
+        etru.generate(parameters(DEFAULT), priv_key, pub_key)
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'etru.py')
+        for size in sizes:
+            text = random_text(size)
+            cipher = etru.encrypt(pub_key, text, block=True)
+            record(f"block_encrypt/bytes={size}",
+                   measure(lambda: etru.encrypt(pub_key, text, block=True), max(repeat // 4, 1)))
+            record(f"block_decrypt/bytes={size}",
+                   measure(lambda: etru.decrypt(priv_key, cipher, block=True), max(repeat // 4, 1)))
+            data = text.encode()
+            sealed = ETRUHybrid.encrypt(etru.load_public_key(pub_key), data)
+            record(f"hybrid_encrypt/bytes={size}",
+                   measure(lambda: ETRUHybrid.encrypt(etru.load_public_key(pub_key), data), repeat))
+            record(f"hybrid_decrypt/bytes={size}",
+                   measure(lambda: ETRUHybrid.decrypt(etru.load_private_key(priv_key), sealed), repeat))
+            plain_file, cipher_file = os.path.join(directory, 'plain'), os.path.join(directory, 'cipher')
+            with open(plain_file, 'w') as file:
+                file.write(text)
+            with open(cipher_file, 'wb') as file:
+                subprocess.run([sys.executable, script, '-b', '-x', 'enc', pub_key], stdin=open(plain_file, 'rb'),
+                               stdout=file, check=True)
+            record(f"cli_block_enc/bytes={size}",
+                   measure_process([sys.executable, script, '-b', '-x', 'enc', pub_key], plain_file, cli_repeat))
+            record(f"cli_block_dec/bytes={size}",
+                   measure_process([sys.executable, script, '-b', 'dec', priv_key], cipher_file, cli_repeat))
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    '''Names of the cases whose p50 latency is more than tolerance slower than in the baseline'''
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['p50_ms'], result['p50_ms']
+        change = after / before - 1
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<36} {before:10.3f} -> {after:10.3f} ms  {change:+7.1%}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    args = docopt(__doc__)
+    results = run(args['--params'].split(','), [int(size) for size in args['--bytes'].split(',')],
+                  int(args['--repeat']), int(args['--cli-repeat']))
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+    with open(args['--output'], 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args['--output']}")
+    if args['--baseline']:
+        with open(args['--baseline']) as file:
+            baseline = json.load(file)['results']
+        regressions = compare(results, baseline, float(args['--tolerance']))
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {float(args['--tolerance']):.0%}")
+            sys.exit(1)
@@ -1,64 +1,22 @@
-import random
+import numpy as np
 
-from Eisenstein import EisensteinElement
+import EisensteinKernels
+from Eisenstein import ONE, ZERO, EisensteinElement
 from EisensteinPolynomial import EisensteinPolynomial
+from EisensteinArray import EisensteinRingElement
+from EisensteinField import field
+from EisensteinMultiplier import Multiplier
+from EisensteinSparse import UnitPolynomial, is_unit_array
+from ETRUParameters import ParameterSet, find_parameters
+from ETRUSampler import Sampler
 
-zero = EisensteinElement(0, 0)
-one = EisensteinElement(1, 0)
+zero = ZERO
+one = ONE
 
-
-def _generate_random_ploy(d):
-    '''
-    Generate Random Eisenstein Polynomial of degree 7d
-    '''
-    list = [EisensteinElement(0, 0), EisensteinElement(1, 0), EisensteinElement(-1, 0),
-            EisensteinElement(0, 1), EisensteinElement(0, -1), EisensteinElement(-1, -1), EisensteinElement(1, 1)
-            ] * d
-    # list.append(one)
-    random.shuffle(list)
-    # index = random.sample(range(len(list) + 1))
-    # list.insert(index,one)
-    return list
-
-
-def mod(a: EisensteinPolynomial, b: EisensteinPolynomial) -> EisensteinPolynomial:
-    '''
-    Calculate A mod B, B's leading coefficient must be one.
-    '''
-    if isinstance(a, EisensteinPolynomial) and isinstance(b, EisensteinPolynomial):
-        dividend_coeffs = a.coefficients
-        divisor_coeffs = b.coefficients
-        # Ensure the divisor is not zero
-        if len(divisor_coeffs) == 1 and divisor_coeffs[0] == zero:
-            raise ZeroDivisionError("Polynomial division by zero")
-
-        # Initialize the quotient and remainder as empty lists
-        quotient_coeffs = [zero] * (len(dividend_coeffs) - len(divisor_coeffs) + 1)
-        remainder_coeffs = dividend_coeffs.copy()
-
-        # Perform long division algorithm
-        while len(remainder_coeffs) >= len(divisor_coeffs):
-            # Get the leading terms of the dividend and divisor
-            dividend_leading = remainder_coeffs[0]
-            divisor_leading = divisor_coeffs[0]
-
-            # Compute the quotient of leading terms
-            # quotient_leading = dividend_leading / divisor_leading
-            quotient_leading = dividend_leading
-
-            # Add the quotient to the quotient list
-            quotient_coeffs[len(divisor_coeffs) - len(remainder_coeffs) - 1] = quotient_leading
-
-            # Multiply the divisor by the quotient and subtract from the dividend
-            for i in range(len(divisor_coeffs)):
-                remainder_coeffs[i] -= quotient_leading * divisor_coeffs[i]
-                remainder_coeffs[i] = remainder_coeffs[i]
-
-            # Remove leading zeros in the remainder
-            while len(remainder_coeffs) > 0 and remainder_coeffs[0] == zero:
-                remainder_coeffs = remainder_coeffs[1:]
-
-        return EisensteinPolynomial(remainder_coeffs)
+# private key forms: f random with f_p = f^-1 mod p, or f = 1 + p*F with f_p = 1
+RANDOM_KEY = 'random'
+PF_KEY = '1+pF'
+KEY_MODES = (RANDOM_KEY, PF_KEY)
 
 
 class ETRU:
@@ -68,54 +26,212 @@ class ETRU:
     f_poly = None
     g_poly = None
     h_poly = None
+    ph_poly = None
     f_p_poly = None
     f_q_poly = None
     R_poly = None
-
-    def __init__(self, N, p, q):
+    multiplier = None
+    params = None
+    key_mode = RANDOM_KEY
+    p_residues = None
+    q_residues = None
+    sampler = None
+
+    def __init__(self, N, p, q, backend='auto', params=None, sampler=None):
         self.N = N
         self.p = p
         self.q = q
-        self.R_poly = EisensteinPolynomial([one] + [zero for i in range(N - 1)] + [zero - one])
-
-    def generate_random_keys(self):
-        g_poly = EisensteinPolynomial(_generate_random_ploy(self.N // 7))
-        tries = 10
+        # R_poly and the residue tables of p and q are built once per parameter set
+        self.params = params if params is not None else find_parameters(N, p, q)
+        self.p_residues = self.params.p_residues
+        self.q_residues = self.params.q_residues
+        self.multiplier = Multiplier(backend)
+        # batches and reductions run in the native kernels of helpers where it has them, unless a backend was chosen
+        self.native = backend == 'auto' and EisensteinKernels.available()
+        self.R_poly = self.params.R_poly
+        # keys and blinding polynomials, pass Sampler(seed) for reproducible ones
+        self.sampler = sampler if sampler is not None else Sampler()
+
+    @classmethod
+    def from_parameters(cls, params: ParameterSet, backend='auto', sampler=None):
+        return cls(params.N, params.p, params.q, backend, params, sampler)
+
+    def generate_random_keys(self, key_mode=RANDOM_KEY, tries=10):
+        '''key_mode PF_KEY generates f = 1 + p*F, decryption then needs no multiplication by f_p'''
+        g_poly = self.random_g()
         while tries > 0 and (self.h_poly is None):
-            list = _generate_random_ploy(self.N // 7)
-            index = random.sample(range(len(list) + 1), 1)[0]
-            list.insert(index, one)
-            f_poly = EisensteinPolynomial(list)
+            f_poly = self.random_f(key_mode)
             try:
-                self.generate_public_keys(f_poly, g_poly)
+                self.generate_public_keys(f_poly, g_poly, key_mode)
             except ZeroDivisionError:
-                print(f_poly)
                 tries -= 1
         if self.h_poly is None:
             raise Exception("Couldn't generate invertible f")
 
-    def generate_public_keys(self, f_poly, g_poly):
-        self.f_poly = f_poly
-        self.g_poly = g_poly
-        self.f_p_poly = self.f_poly.invert(mod=self.R_poly, module=self.p)
-        self.f_q_poly = self.f_poly.invert(mod=self.R_poly, module=self.q)
-        self.h_poly = mod(self.f_q_poly * self.g_poly, self.R_poly) % self.q
-
-    def encrypt(self, msg_poly: EisensteinPolynomial, rand_poly: EisensteinPolynomial) -> EisensteinPolynomial:
+    def random_f(self, key_mode=RANDOM_KEY):
+        '''Private key candidate f of key_mode, it may not be invertible'''
+        if key_mode not in KEY_MODES:
+            raise ValueError(f"Unknown key mode {key_mode}, choose one of {', '.join(KEY_MODES)}")
+        if key_mode == PF_KEY:
+            F_poly = self.ring(self.sampler.unit_polynomial(self.N, self.params.F_weight, self.params.balanced))
+            return F_poly * self.p + self.ring(EisensteinPolynomial([one]))
+        return self.sampler.unit_polynomial(self.N, self.params.f_weight, self.params.balanced)
 
-        # return (((rand_poly * self.h_poly * self.p) + msg_poly).__mod__(self.R_poly, self.q)) % self.q
-        return mod((rand_poly * self.h_poly * self.p) + msg_poly, self.R_poly) % self.q
+    def random_g(self) -> UnitPolynomial:
+        return self.sampler.unit_polynomial(self.N, self.params.g_weight, self.params.balanced)
 
-    def decrypt(self, msg_poly: EisensteinPolynomial) -> EisensteinPolynomial:
-        # a_poly = ((self.f_poly * msg_poly).__mod__(self.R_poly, self.q)) % self.q
-        a_poly = mod(self.f_poly * msg_poly, self.R_poly) % self.q
-        # return ((self.f_p_poly * a_poly).__mod__(self.R_poly, self.p)) % self.p
-        return mod(self.f_p_poly * a_poly, self.R_poly) % self.p
+    def generate_public_keys(self, f_poly, g_poly, key_mode=RANDOM_KEY):
+        self.f_poly = f_poly
+        self.g_poly = g_poly
+        self.key_mode = key_mode
+        # f = 1 + p*F is 1 mod p, there is nothing to invert
+        if key_mode == PF_KEY:
+            self.f_p_poly = self.ring(EisensteinPolynomial([one]))
+        else:
+            self.f_p_poly = self.invert(self.f_poly, self.p)
+        self.f_q_poly = self.invert(self.f_poly, self.q)
+        self.set_public_key(self.reduce(self.ring_mul(self.g_poly, self.f_q_poly), self.q_residues))
+
+    def invert(self, poly, module: EisensteinElement) -> EisensteinRingElement:
+        '''
+        Inverse of poly in (Z[ω]/module)[x]/(x^N - 1).
+        Works in the finite field Z[ω]/module when it is one, otherwise falls back to extended Euclid over Z[ω]
+        '''
+        try:
+            inverse_field = field(module.x, module.y)
+        except ValueError:
+            if not isinstance(poly, EisensteinPolynomial):
+                poly = self.ring(poly).to_polynomial()
+            return self.ring(poly.invert(mod=self.R_poly, module=module))
+        return EisensteinRingElement(inverse_field.invert_polynomial(self.ring(poly).array, self.N), self.N)
+
+    def random_blinding(self) -> UnitPolynomial:
+        '''Blinding polynomial r with the weight of the parameter set'''
+        return self.sampler.unit_polynomial(self.N, self.params.r_weight, self.params.balanced)
+
+    def random_blinding_batch(self, count: int) -> np.ndarray:
+        '''(count, N, 2) blinding polynomials for encrypt_batch, sampled in one call'''
+        return self.sampler.coordinates(count, self.N, self.params.r_weight, self.params.balanced)
+
+    def set_public_key(self, h_poly):
+        '''
+        Load the public key h and precompute p*h, encryption multiplies by p*h directly.
+        Its ring matrix, N^2 floats, is built only for the schoolbook backend, the only one that uses it.
+        '''
+        self.h_poly = self.ring(h_poly)
+        self.ph_poly = self.h_poly * self.p
+        if self.multiplier.strategy(self.N) == 'schoolbook':
+            self.ph_poly.precompute()
+
+    def set_private_key(self, f_poly, f_p_poly, key_mode=RANDOM_KEY):
+        '''
+        Load the private key f, f_p and, for the schoolbook backend, precompute the ring matrices decryption
+        multiplies by. For 'auto' and 'sparse' f of units is kept as a UnitPolynomial for rotate-and-add.
+        '''
+        self.key_mode = key_mode
+        self.f_poly = self.ring(f_poly)
+        if self.multiplier.strategy(self.N) == 'schoolbook':
+            self.f_poly.precompute()
+        elif self.multiplier.backend in ('auto', 'sparse') and is_unit_array(self.f_poly.array):
+            self.f_poly = UnitPolynomial.from_array(self.f_poly.array)
+        self.f_p_poly = self.ring(f_p_poly)
+        if key_mode != PF_KEY and self.multiplier.strategy(self.N) == 'schoolbook':
+            self.f_p_poly.precompute()
+
+    def ring(self, poly) -> EisensteinRingElement:
+        '''Lift a polynomial of any representation into Z[ω][x]/(x^N - 1)'''
+        if isinstance(poly, UnitPolynomial):
+            return poly.to_ring()
+        return EisensteinRingElement.from_polynomial(poly, self.N)
+
+    def reduce(self, poly, context) -> EisensteinRingElement:
+        '''poly % context.module by table lookup, context is self.p_residues or self.q_residues'''
+        return EisensteinRingElement(context.reduce(self.ring(poly).array, self.native), self.N)
+
+    def ring_mul(self, a, key) -> EisensteinRingElement:
+        '''
+        a * key in Z[ω][x]/(x^N - 1) with the multiplication backend of this instance.
+        key is the operand that stays fixed across calls, its ring matrix is reused by the schoolbook backend.
+        With the backends 'auto' and 'sparse' a UnitPolynomial operand is multiplied by rotate-and-add, except by
+        a key whose ring matrix is already built, the matrix product is faster then.
+        '''
+        units = self._units(key, a)
+        if units is not None:
+            other = key if units is a else a
+            return EisensteinRingElement(units.apply(self.ring(other).array), self.N)
+        a, key = self.ring(a), self.ring(key)
+        if self.multiplier.strategy(self.N) == 'schoolbook':
+            return a * key
+        return EisensteinRingElement(self.multiplier.ring_multiply(a.array, key.array, self.N), self.N)
+
+    def ring_mul_batch(self, blocks: np.ndarray, key) -> np.ndarray:
+        '''Stacked ring_mul: every (N, 2) block of a (B, N, 2) array times the fixed key'''
+        if self._units(key) is key:
+            return key.apply(blocks)
+        key = self.ring(key)
+        if self.multiplier.strategy(self.N) == 'schoolbook':
+            return key.apply(blocks)
+        blocks = np.asarray(blocks, dtype=np.int64)
+        products = [self.multiplier.ring_multiply(block, key.array, self.N) for block in blocks]
+        return np.array(products, dtype=np.int64).reshape(-1, self.N, 2)
+
+    def _units(self, key, a=None):
+        '''
+        The UnitPolynomial operand of key * a to rotate-and-add with, None for the dense product.
+        Only the backends 'auto' and 'sparse' rotate and add, the others keep to the backend that was chosen.
+        '''
+        if self.multiplier.backend not in ('auto', 'sparse'):
+            return None
+        if (self.multiplier.strategy(self.N) == 'schoolbook' and isinstance(key, EisensteinRingElement)
+                and key.precomputed):
+            return None
+        for operand in (key, a):
+            if isinstance(operand, UnitPolynomial):
+                return operand
+        return None
+
+    def encrypt(self, msg_poly: EisensteinPolynomial, rand_poly: EisensteinPolynomial) -> EisensteinRingElement:
+
+        # return mod((rand_poly * self.h_poly * self.p) + msg_poly, self.R_poly) % self.q
+        return self.reduce(self.ring_mul(rand_poly, self.ph_poly) + self.ring(msg_poly), self.q_residues)
+
+    def encrypt_batch(self, msg_blocks: np.ndarray, rand_blocks: np.ndarray) -> np.ndarray:
+        '''
+        Encrypt a stack of message blocks in one call.
+        Input: (B, N, 2) message and blinding coefficients, highest degree first
+        Output: (B, N, 2) cipher text coefficients
+        '''
+        if self.native:
+            return EisensteinKernels.encrypt_batch(msg_blocks, rand_blocks, self.ph_poly.array, self.q)
+        return self.q_residues.reduce(self.ring_mul_batch(rand_blocks, self.ph_poly) + msg_blocks)
+
+    def decrypt(self, msg_poly: EisensteinPolynomial) -> EisensteinRingElement:
+        # a_poly = mod(self.f_poly * msg_poly, self.R_poly) % self.q
+        a_poly = self.reduce(self.ring_mul(msg_poly, self.f_poly), self.q_residues)
+        if self.key_mode == PF_KEY:
+            # f_p = 1: a = p*r*g + m + p*F*m is m mod p
+            return self.reduce(a_poly, self.p_residues)
+        # return mod(self.f_p_poly * a_poly, self.R_poly) % self.p
+        return self.reduce(self.ring_mul(a_poly, self.f_p_poly), self.p_residues)
+
+    def decrypt_batch(self, msg_blocks: np.ndarray) -> np.ndarray:
+        '''
+        Decrypt a stack of cipher text blocks in one call.
+        Input: (B, N, 2) cipher text coefficients, highest degree first
+        Output: (B, N, 2) message coefficients
+        '''
+        if self.native:
+            f_p = None if self.key_mode == PF_KEY else self.f_p_poly.array
+            return EisensteinKernels.decrypt_batch(msg_blocks, self.f_poly.array, f_p, self.p, self.q)
+        a_blocks = self.q_residues.reduce(self.ring_mul_batch(msg_blocks, self.f_poly))
+        if self.key_mode == PF_KEY:
+            return self.p_residues.reduce(a_blocks)
+        return self.p_residues.reduce(self.ring_mul_batch(a_blocks, self.f_p_poly))
 
     def verify(self):
-        print((self.f_poly * self.f_p_poly).__mod__(self.R_poly, self.p) % self.p)
-        print((self.f_q_poly * self.f_poly).__mod__(self.R_poly, self.q) % self.q)
-        print((self.f_poly * self.h_poly).__mod__(self.R_poly, self.q) % self.q == self.g_poly % self.q)
+        print(self.ring_mul(self.f_poly, self.f_p_poly) % self.p)
+        print(self.ring_mul(self.f_poly, self.f_q_poly) % self.q)
+        print(self.ring_mul(self.f_poly, self.h_poly) % self.q == self.ring(self.g_poly) % self.q)
 
 
 if __name__ == "__main__":
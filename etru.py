@@ -5,6 +5,7 @@ Usage:
   etru.py [options] enc PUB_KEY_FILE [FILE]
   etru.py [options] dec PRIV_KEY_FILE [FILE]
   etru.py [options] gen PRIV_KEY_FILE PUB_KEY_FILE
+  etru.py [options] serve
   etru.py (-h | --help)
 
 Options:
@@ -14,23 +15,74 @@ Options:
                        represented by integer array.
   -o, --poly-output  Interpret output as polynomial
                        represented by integer array.
+  -s, --stream       Stream mode: encrypt/decrypt fixed-size
+                       chunks and write output as it goes,
+                       memory use is constant.
+  -x, --binary       Write cipher text in the binary container
+                       format, dec detects it by itself.
+  -k, --hybrid       Hybrid mode for bulk data: one ETRU block
+                       carries a session key, the input is
+                       encrypted with a SHAKE-128 keystream and
+                       HMAC-SHA256 tags, dec detects it by itself.
+  -j, --jobs=JOBS    Worker processes for block and stream
+                       mode and gen [default: 1].
+  --count=COUNT      Key pairs made by gen, numbered -1, -2, ...
+                       in the file names if more than one
+                       [default: 1].
+  --params=NAME      Parameter set of gen: etru107, etru251,
+                       etru251s or etru503 [default: etru251s].
+  --key-mode=MODE    Private key of gen: random, or 1+pF for
+                       f = 1 + p*F, which makes dec skip the
+                       multiplication by f_p [default: random].
+  --socket=PATH      Unix socket of the daemon: serve listens
+                       on it, enc/dec send their request to it.
+                       Required by serve.
+  --profile          Print the time of every phase and counts
+                       of ring operations to standard error.
+  --profile-file=FILE  Write that report as JSON to FILE.
   -h, --help         Show this screen.
   -d, --debug        Debug mode.
 '''
-import math
+import collections
+import contextlib
+import functools
+import io
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 from docopt import docopt
-import helpers
-from classETRU import ETRU, _generate_random_ploy
+import CipherFile
+import ETRUHybrid
+from classETRU import ETRU, RANDOM_KEY
+from EisensteinArray import EisensteinArrayPolynomial, EisensteinRingElement
+from ETRUKeyGen import generate_keys
+from ETRUParameters import ParameterSet, find_parameters, parameters
 from utils import *
 
 Debug = False  # DeBug Mode
 
 
-def generate(N, p, q, priv_key: object, pub_key):
-    etru = ETRU(N, p, q)
-    etru.generate_random_keys()
+def generate(params: ParameterSet, priv_key: object, pub_key, key_mode=RANDOM_KEY, count=1, jobs=1):
+    '''
+    Generate key pairs and save them to priv_key and pub_key.
+    With count > 1 the files of pair i are named with -i before the extension, from 1 on.
+    '''
+    with contextlib.closing(generate_keys(params, key_mode, count, jobs)) as keys:
+        for i, etru in enumerate(keys, 1):
+            if count == 1:
+                save_keys(etru, priv_key, pub_key)
+            else:
+                save_keys(etru, _numbered(priv_key, i), _numbered(pub_key, i))
+
+
+def _numbered(file_name: str, i: int) -> str:
+    root, extension = os.path.splitext(file_name)
+    return f"{root}-{i}{extension}"
+
+
+def save_keys(etru: ETRU, priv_key, pub_key):
+    N, p, q, params, key_mode = etru.N, etru.p, etru.q, etru.params, etru.key_mode
     if Debug:
         etru.verify()
     h = np.array(etru.h_poly.coefficients)
@@ -40,88 +92,270 @@ def generate(N, p, q, priv_key: object, pub_key):
     f_q = np.array(etru.f_q_poly.coefficients)
     # save_dict_with_pickle({N: N, p: p, q: q, f: f, f_p: f_p}, priv_key)
     # save_dict_with_pickle({N: N, p: p, q: q, h: h}, pub_key)
+    # keys of an unnamed set record no name, loading them finds the set of their N, p and q again
+    named = {'params': params.name} if params.name is not None else {}
     if Debug:
-        np.savez_compressed(priv_key, N=N, p=p, q=q, f=f, f_p=f_p, g=g, f_q=f_q)
+        np.savez_compressed(priv_key, N=N, p=p, q=q, **named, key_mode=key_mode, f=f, f_p=f_p, g=g, f_q=f_q)
     else:
-        np.savez_compressed(priv_key, N=N, p=p, q=q, f=f, f_p=f_p)
-    np.savez_compressed(pub_key, N=N, p=p, q=q, h=h)
+        np.savez_compressed(priv_key, N=N, p=p, q=q, **named, key_mode=key_mode, f=f, f_p=f_p)
+    np.savez_compressed(pub_key, N=N, p=p, q=q, **named, h=h)
+
+
+STREAM_BATCH = 64  # blocks encrypted or decrypted together in stream mode
+KEY_CACHE_SIZE = 16  # key contexts kept by load_public_key and load_private_key each
+
+
+def _key_file_stamp(key_file):
+    '''Cache key of a key file, a rewritten key file gets a new mtime and is loaded again'''
+    path = os.path.abspath(key_file)
+    return path, os.stat(path).st_mtime_ns
+
+
+def load_public_key(pub_key_file) -> ETRU:
+    '''
+    Encryption context of a public key file, with p*h and its ring matrix precomputed.
+    Contexts are cached by file path and mtime, repeated calls pay no key setup.
+    '''
+    return _load_public_key(*_key_file_stamp(pub_key_file))
+
+
+def load_private_key(priv_key_file) -> ETRU:
+    '''Decryption context of a private key file, with the ring matrices of f and f_p precomputed, cached the same way'''
+    return _load_private_key(*_key_file_stamp(priv_key_file))
+
+
+def _key_context(key) -> ETRU:
+    '''ETRU instance of the parameter set of a key file, older and unnamed ones get the set of their N, p and q'''
+    N = int(key['N'])
+    p = EisensteinElement(key['p'].item().x, key['p'].item().y)
+    q = EisensteinElement(key['q'].item().x, key['q'].item().y)
+    # key files of unnamed sets written before they left the name out have params None
+    if 'params' in key.files and key['params'].item() is not None:
+        params = parameters(str(key['params']))
+        if not params.matches(N, p, q):
+            raise ValueError(f"Key file parameters N={N}, p={p}, q={q} don't match the parameter set {params.name}")
+    else:
+        params = find_parameters(N, p, q)
+    return ETRU.from_parameters(params)
+
+
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def _load_public_key(pub_key_file, mtime) -> ETRU:
+    pub_key = np.load(pub_key_file, allow_pickle=True)
+    etru = _key_context(pub_key)
+    etru.set_public_key(EisensteinRingElement.from_list(list(pub_key['h']), etru.N))
+    return etru
+
+
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def _load_private_key(priv_key_file, mtime) -> ETRU:
+    priv_key = np.load(priv_key_file, allow_pickle=True)
+    etru = _key_context(priv_key)
+    # f_p of a 1+pF key is stored as well, it is 1, so that older versions decrypt with it all the same
+    key_mode = str(priv_key['key_mode']) if 'key_mode' in priv_key.files else RANDOM_KEY
+    etru.set_private_key(EisensteinRingElement.from_list(list(priv_key['f']), etru.N),
+                         EisensteinRingElement.from_list(list(priv_key['f_p']), etru.N), key_mode)
+    return etru
+
+
+def message_blocks(etru: ETRU, digits: np.ndarray) -> np.ndarray:
+    '''(B, N, 2) message blocks of a (B, n) base-7 digit array, the digits are the lowest n coefficients'''
+    msg_blocks = np.zeros((len(digits), etru.N, 2), dtype=np.int64)
+    msg_blocks[:, etru.N - digits.shape[1]:] = RP_COORDINATES[digits]
+    return msg_blocks
+
+
+def random_blocks(etru: ETRU, block_count: int) -> np.ndarray:
+    '''(block_count, N, 2) blinding polynomials'''
+    return etru.random_blinding_batch(block_count)
+
+
+def cipher_to_text(output: np.ndarray) -> str:
+    '''Text form of cipher text coefficients, one character per coordinate, negatives as chr(0x10000 + num)'''
+    output = np.asarray(output, dtype=np.int64).reshape(-1)
+    codes = np.where(output < 0, 0x10000 + output, output).astype('<u4')
+    return codes.tobytes().decode('utf-32-le')
+
+
+def text_to_cipher(input_str: str) -> np.ndarray:
+    '''Inverse function of cipher_to_text(), returns a (len, 2) array'''
+    codes = np.frombuffer(input_str.encode('utf-32-le'), dtype='<u4').astype(np.int64)
+    codes = np.where(codes >= 0x10000, codes - 0x10000, codes)
+    codes = np.where(codes > 10000, codes - 65536, codes)
+    return codes.reshape(-1, 2)
+
+
+_worker_context = None
+
+
+def _init_worker(key_file, private):
+    '''Pool initializer, every worker loads the key context once instead of receiving it with every task'''
+    global _worker_context
+    _worker_context = load_private_key(key_file) if private else load_public_key(key_file)
+
+
+def _run_in_worker(function, batch):
+    return function(_worker_context, batch)
+
+
+def map_batches(function, batches, key_file, private=False, jobs=1):
+    '''
+    Yield function(etru, batch) for every batch, in input order.
+    With jobs > 1 the batches run in a pool of jobs processes, at most 2 * jobs batches are in flight.
+    '''
+    if jobs <= 1:
+        etru = load_private_key(key_file) if private else load_public_key(key_file)
+        for batch in batches:
+            yield function(etru, batch)
+        return
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(key_file, private)) as executor:
+        pending = collections.deque()
+        for batch in batches:
+            pending.append(executor.submit(_run_in_worker, function, batch))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
 
+def _encrypt_chunks(etru: ETRU, data: bytes) -> np.ndarray:
+    '''(B, N, 2) cipher text blocks of data, chunk_size(n) bytes per block'''
+    digits = encode_chunks(data, etru.params.block_size)
+    return etru.encrypt_batch(message_blocks(etru, digits), random_blocks(etru, len(digits)))
 
-def encrypt(pub_key, input_str: str, block=False) -> np.array:
-    pub_key = np.load(pub_key, allow_pickle=True)
-    p = EisensteinElement(pub_key['p'].item().x, pub_key['p'].item().y)
-    q = EisensteinElement(pub_key['q'].item().x, pub_key['q'].item().y)
-    etru = ETRU(int(pub_key['N']), p, q)
-    etru.h_poly = EisensteinPolynomial(list(pub_key['h']))
+
+def _decrypt_blocks(etru: ETRU, cipher_blocks: np.ndarray) -> np.ndarray:
+    '''(B, n, 2) message digit coefficients of (B, N, 2) cipher text blocks, the lowest n coefficients of each'''
+    return etru.decrypt_batch(np.asarray(cipher_blocks))[:, etru.N - etru.params.block_size:]
+
+
+def _decrypt_chunks(etru: ETRU, cipher_blocks: np.ndarray) -> bytes:
+    return decode_chunks(coordinates_to_digits(_decrypt_blocks(etru, cipher_blocks)))
+
+
+def encrypt(pub_key, input_str: str, block=False, jobs=1) -> np.array:
+    etru = load_public_key(pub_key)
     if not block:
         try:
-            msg_poly = eisenstein_encode(input_str)
-            msg_poly = EisensteinPolynomial(msg_poly)
+            msg_poly = eisenstein_encode(input_str, etru.N)
+            msg_poly = EisensteinArrayPolynomial.from_list(msg_poly)
         except OverflowError:
             raise OverflowError("Input String is too large for current N, use block mode")
-        output = etru.encrypt(msg_poly, EisensteinPolynomial(_generate_random_ploy(etru.N // 8))).coefficients
+        output = etru.encrypt(msg_poly, etru.random_blinding()).array
     else:
-        rp_elements = [
-            EisensteinElement(0, 0),
-            EisensteinElement(1, 0),
-            EisensteinElement(-1, 0),
-            EisensteinElement(0, 1),
-            EisensteinElement(0, -1),
-            EisensteinElement(1, 1),
-            EisensteinElement(-1, -1),
-        ]
-        input_str = input_str.encode('utf-8')
-        input_str = int(binascii.hexlify(input_str),16)
-        input_str = helpers.convertToBase7(f"{input_str}")
-
-        input_arr = [input_str[i:i + n] for i in range(0, len(input_str), n)]
-        if len(input_arr[-1]) < n:
-            # padding the last bit_string to length n
-            input_arr[-1] = input_arr[-1].ljust(n, '0')
-
-        input_arr = list(map(lambda element: [rp_elements[int(i)] for i in element], input_arr))
-        # Reshape it into a two-dimensional array with a shape of (n, N),
-        # where n is automatically determined based on the number of elements in the array and the value of N
-        # input_arr = input_arr.reshape((-1, etru.N))
-        output = np.array([])
-        block_count = len(input_arr)
-        for i in range(block_count):
-            msg_poly = EisensteinPolynomial(input_arr[i])
-            block_output = etru.encrypt(msg_poly,
-                                        EisensteinPolynomial(_generate_random_ploy(etru.N // 8))).coefficients
-
-            # if len(block_output) < 2 * etru.N:
-            # block_output = np.pad(block_output, (0, 2 * etru.N - len(block_output)), 'constant')
-            output = np.concatenate((output, block_output))
-    return np.array(output).flatten()
-
-
-def decrypt(priv_key_file, input_arr: list, block=False) -> list:
-    priv_key = np.load(priv_key_file, allow_pickle=True)
-    p = EisensteinElement(priv_key['p'].item().x, priv_key['p'].item().y)
-    q = EisensteinElement(priv_key['q'].item().x, priv_key['q'].item().y)
-    etru = ETRU(int(priv_key['N']), p, q)
-    etru.f_poly = EisensteinPolynomial(list(priv_key['f']))
-    etru.f_p_poly = EisensteinPolynomial(list(priv_key['f_p']))
+        # every block holds its own chunk of the input, see encode_chunks
+        data = input_str.encode('utf-8')
+        size = etru.params.chunk_size * STREAM_BATCH
+        batches = [data[i:i + size] for i in range(0, len(data), size)]
+        outputs = list(map_batches(_encrypt_chunks, batches, pub_key, jobs=jobs))
+        output = np.concatenate(outputs) if outputs else np.zeros((0, 2), dtype=np.int64)
+    return output.flatten()
+
+
+def decrypt(priv_key_file, input_arr: np.ndarray, block=False, jobs=1) -> np.ndarray:
+    etru = load_private_key(priv_key_file)
     # input_arr = np.fromiter((ord(char) for char in input_str), dtype=np.int64)
     # input_arr = np.trim_zeros(input_arr)
 
     if not block:
         if etru.N < len(input_arr):
             raise OverflowError("Input is too large for current N")
-        input = EisensteinPolynomial(input_arr)
-        return etru.decrypt(input).coefficients
+        input = EisensteinArrayPolynomial(input_arr)
+        return etru.decrypt(input).array
     else:
-        input = np.array(input_arr).reshape((-1, n))
-        output = np.array([])
-        block_count = input.shape[0]
-        for i, b in enumerate(input, start=1):
-            block_output = etru.decrypt(EisensteinPolynomial(list(b))).coefficients
-            #if len(block_output) < etru.N:
-                #block_output = np.pad(block_output, (0, etru.N - len(block_output)), 'constant')
-            output = np.concatenate((output, block_output))
-        #return padding_decode(output, etru.N)
-        return list(output.flatten())
+        input = np.asarray(input_arr).reshape((-1, etru.N, 2))
+        batches = [input[i:i + STREAM_BATCH] for i in range(0, len(input), STREAM_BATCH)]
+        outputs = list(map_batches(_decrypt_blocks, batches, priv_key_file, private=True, jobs=jobs))
+        if not outputs:
+            return np.zeros((0, etru.params.block_size, 2), dtype=np.int64)
+        return np.concatenate(outputs)
+
+
+def encrypt_stream(pub_key, input_file, output_file, batch=STREAM_BATCH, binary=False, jobs=1):
+    '''
+    Stream mode encryption. Reads input_file (binary) batch by batch, every chunk of chunk_size(n) bytes becomes
+    one block, and writes the cipher text of every batch of blocks to output_file (binary) as it goes.
+    In the binary format the header is rewritten with the final length when output_file can seek.
+    '''
+    etru = load_public_key(pub_key)
+    size = etru.params.chunk_size
+    header = CipherFile.CipherHeader(etru.N, etru.p, etru.q)
+    start = output_file.tell() if binary and output_file.seekable() else None
+    if binary:
+        output_file.write(header.pack())
+    batches = iter(functools.partial(input_file.read, size * batch), b'')
+    for output in map_batches(_encrypt_chunks, batches, pub_key, jobs=jobs):
+        if binary:
+            output_file.write(output.astype(header.dtype).tobytes())
+            header.length += len(output) * etru.N
+        else:
+            output_file.write(cipher_to_text(output).encode())
+    if start is not None:
+        end = output_file.tell()
+        output_file.seek(start)
+        output_file.write(header.pack())
+        output_file.seek(end)
+
+
+def decrypt_stream(priv_key_file, input_file, output_file, batch=STREAM_BATCH, jobs=1):
+    '''
+    Stream mode decryption. Reads the cipher text of encrypt_stream() from input_file (binary) batch by batch
+    and writes the decrypted chunks to output_file (binary) as it goes. Both cipher text formats are accepted.
+    '''
+    etru = load_private_key(priv_key_file)
+    batches = _read_cipher_batches(input_file, etru, batch)
+    for chunks in map_batches(_decrypt_chunks, batches, priv_key_file, private=True, jobs=jobs):
+        output_file.write(chunks)
+
+
+def _read_cipher_batches(input_file, etru: ETRU, batch: int):
+    '''(B, N, 2) cipher text blocks of input_file, at most batch blocks at a time'''
+    if CipherFile.is_binary(input_file.peek(len(CipherFile.MAGIC))):
+        header = CipherFile.read_header(input_file)
+        header.check(etru.N, etru.p, etru.q)
+        while True:
+            data = input_file.read(2 * etru.N * header.itemsize * batch)
+            if not data:
+                break
+            yield np.frombuffer(data, dtype=header.dtype).reshape(-1, etru.N, 2)
+    else:
+        # newline='' keeps cipher text characters such as chr(13) untouched
+        text = io.TextIOWrapper(input_file, encoding='utf-8', newline='')
+        while True:
+            input_str = text.read(2 * etru.N * batch)
+            if not input_str:
+                break
+            yield text_to_cipher(input_str).reshape(-1, etru.N, 2)
+
+
+def read_cipher(priv_key_file, input_file=None):
+    '''
+    Cipher text coefficients as a (len, 2) array, from the path input_file or from standard input.
+    A binary container file is memory-mapped, its parameters must match the key.
+    '''
+    if input_file is None or input_file == '-':
+        data = sys.stdin.buffer.read()
+        if not CipherFile.is_binary(data):
+            return text_to_cipher(data.decode())
+        header, input_arr = CipherFile.loads(data)
+    else:
+        with open(input_file, 'rb') as file:
+            binary = CipherFile.is_binary(file.read(len(CipherFile.MAGIC)))
+        if not binary:
+            with open(input_file, 'rb') as file:
+                return text_to_cipher(file.read().decode())
+        header, input_arr = CipherFile.load(input_file)
+    etru = load_private_key(priv_key_file)
+    header.check(etru.N, etru.p, etru.q)
+    return input_arr
+
+
+def is_hybrid_input(input_file=None) -> bool:
+    '''Whether the path input_file, or standard input, holds a hybrid cipher text'''
+    if input_file is None or input_file == '-':
+        return ETRUHybrid.is_hybrid(sys.stdin.buffer.peek(len(ETRUHybrid.MAGIC)))
+    with open(input_file, 'rb') as file:
+        return ETRUHybrid.is_hybrid(file.read(len(ETRUHybrid.MAGIC)))
 
 
 def verify():
@@ -129,20 +363,12 @@ def verify():
         raise NotImplementedError("Verify is specially designed for Debug mode")
 
 
-def calculate_decimal_digits(n):
-    decimal_digits = math.ceil((n * math.log2(7)) / math.log2(10))
-    return decimal_digits
-
-
 if __name__ == "__main__":
     args = docopt(__doc__)
-    # Had better not change these constant. Possibly lead to decryption failure
-    # See chapter 3.1.5 in paper
-    N = 251
-    p = EisensteinElement(2, 3)
-    q = EisensteinElement(0, 167)
-    n = (calculate_decimal_digits(N) - 1) // 2 - 2
-    n *= 2  # n must be odd
+    # N, p and q come from a named parameter set, see ETRUParameters.py and chapter 3.1.5 in paper
+    params = parameters(args['--params'])
+    N, p, q = params.N, params.p, params.q
+    n = params.block_size
     if args['--debug']:
         Debug = True
 
@@ -155,25 +381,67 @@ if __name__ == "__main__":
         input_poly = EisensteinPolynomial(eisenstein_encode(message))
         print(f"input poly = {input_poly}")
         output1 = encrypt('key_pub.npz', message)
-        encrypt_poly = EisensteinPolynomial(list(output1))
+        encrypt_poly = EisensteinArrayPolynomial(output1)
         print(f"encrypt poly = {encrypt_poly}")
         priv_key = np.load('key_priv.npz', allow_pickle=True)
         etru = ETRU(int(priv_key['N']), p, q)
-        etru.f_poly = EisensteinPolynomial(list(priv_key['f']))
-        etru.f_p_poly = EisensteinPolynomial(list(priv_key['f_p']))
+        etru.set_private_key(EisensteinPolynomial(list(priv_key['f'])), EisensteinPolynomial(list(priv_key['f_p'])))
         decrypt_poly = etru.decrypt(encrypt_poly)
         print(f"decrypt poly = {decrypt_poly}")
-        print(f"decrypt_poly-input_poly={decrypt_poly - input_poly}")
+        print(f"decrypt_poly-input_poly={decrypt_poly - EisensteinArrayPolynomial.from_polynomial(input_poly)}")
         print(eisenstein_decode(decrypt_poly.coefficients))
 
     else:
         # poly_input = bool(args['--poly-input'])
         poly_output = bool(args['--poly-output'])
         block = bool(args['--block'])
+        stream = bool(args['--stream'])
+        binary = bool(args['--binary'])
+        hybrid = bool(args['--hybrid'])
+        jobs = int(args['--jobs'])
         input_str, output = None, None
-        if not args['gen']:
+        if args['--profile'] or args['--profile-file']:
+            import atexit
+            import ETRUProfiler
+            if args['serve'] or args['--socket']:
+                sys.exit("Profiling is not available for the daemon")
+            ETRUProfiler.start('keygen' if args['gen'] else 'encrypt' if args['enc'] else 'decrypt')
+            atexit.register(ETRUProfiler.stop_and_report, args['--profile-file'])
+        if args['--socket'] and not args['serve']:
+            # thin client, the daemon encrypts or decrypts
+            from ETRUClient import Client
+            if poly_output or stream or hybrid:
+                sys.exit("Poly output, stream and hybrid mode are not available through the daemon")
+            op, key_file = ('enc', args['PUB_KEY_FILE']) if args['enc'] else ('dec', args['PRIV_KEY_FILE'])
+            if args['FILE'] is None or args['FILE'] == '-':
+                payload = sys.stdin.buffer.read()
+            else:
+                with open(args['FILE'], 'rb') as file:
+                    payload = file.read()
+            with Client(args['--socket']) as client:
+                sys.stdout.buffer.write(client.request(op, key_file, payload, block=block, binary=binary))
+            if args['dec'] and not block:
+                sys.stdout.buffer.write(b'\n')
+            sys.exit(0)
+
+        if args['dec'] and not hybrid:
+            # hybrid cipher texts are recognized by their magic, like the binary container
+            hybrid = is_hybrid_input(args['FILE'])
+
+        if args['enc'] and (block or stream or hybrid):
+            # the encrypting side can't tell a block that won't decrypt, keys of a balanced set give many of them
+            key_params = load_public_key(args['PUB_KEY_FILE']).params
+            if key_params.balanced and hybrid:
+                sys.exit(f"Keys of {key_params.name} lose about a third of hybrid cipher texts, "
+                         f"generate keys of etru251s for hybrid mode")
+            if key_params.balanced:
+                print(f"Warning: keys of {key_params.name} fail to decrypt about 45% of the blocks of block and "
+                      f"stream mode, generate keys of etru251s", file=sys.stderr)
+
+        if args['enc'] and not stream and not hybrid:
             if args['FILE'] is None or args['FILE'] == '-':
-                input_str = sys.stdin.read()  # if poly_input else sys.stdin.buffer.read()
+                # bytes, so that newline translation can't touch cipher text characters such as chr(13)
+                input_str = sys.stdin.buffer.read().decode()
             else:
                 with open(args['FILE'], 'rb') as file:
                     input_str = file.read()
@@ -186,36 +454,62 @@ if __name__ == "__main__":
             # input_arr = np.trim_zeros(input_arr, 'b')
 
         if args['gen']:
-            generate(N, p, q, args['PRIV_KEY_FILE'], args['PUB_KEY_FILE'])
+            generate(params, args['PRIV_KEY_FILE'], args['PUB_KEY_FILE'], args['--key-mode'], int(args['--count']),
+                     jobs)
+
+        elif args['serve']:
+            import asyncio
+            import signal
+            import ETRUServer
+            if not args['--socket']:
+                sys.exit("serve needs --socket=PATH")
+            # leave through SystemExit on SIGTERM as well, so that the socket file gets removed
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            try:
+                asyncio.run(ETRUServer.serve(args['--socket']))
+            except KeyboardInterrupt:
+                pass
+
+        elif stream or hybrid:
+            # input and output are never held in memory as a whole
+            if args['FILE'] is None or args['FILE'] == '-':
+                input_file = sys.stdin.buffer
+            else:
+                input_file = open(args['FILE'], 'rb')
+            with input_file:
+                if hybrid and args['enc']:
+                    ETRUHybrid.encrypt_file(load_public_key(args['PUB_KEY_FILE']), input_file, sys.stdout.buffer)
+                elif hybrid:
+                    ETRUHybrid.decrypt_file(load_private_key(args['PRIV_KEY_FILE']), input_file, sys.stdout.buffer)
+                elif args['enc']:
+                    encrypt_stream(args['PUB_KEY_FILE'], input_file, sys.stdout.buffer, binary=binary, jobs=jobs)
+                else:
+                    decrypt_stream(args['PRIV_KEY_FILE'], input_file, sys.stdout.buffer, jobs=jobs)
+            sys.stdout.buffer.flush()
 
         elif args['enc']:
-            output = encrypt(args['PUB_KEY_FILE'], input_str, block=block)
+            output = encrypt(args['PUB_KEY_FILE'], input_str, block=block, jobs=jobs)
             # output type: <class 'numpy.ndarray'>
             if poly_output:
-                print(EisensteinPolynomial(list(output)))
+                print(EisensteinArrayPolynomial(output))
+            elif binary:
+                etru = load_public_key(args['PUB_KEY_FILE'])
+                sys.stdout.buffer.write(CipherFile.dumps(output, etru.N, etru.p, etru.q))
             else:
-                output = output.tolist()
-                o = [item for out in output for item in (out.x, out.y)]
-                # print(o)
-                output_string = ''.join(chr(0x10000 + num) if num < 0 else chr(num) for num in o)
+                output_string = cipher_to_text(output)
                 with open("ciphertext.txt", "w") as file:
                     file.write(output_string)
                 sys.stdout.buffer.write(output_string.encode())
 
         elif args['dec']:
-            # input_str = input_str.decode()
-            input_arr = [ord(char) - 0x10000 if ord(char) >= 0x10000 else ord(char)
-                         for char in input_str]
-            input_arr = list(map(lambda x: x - 65536 if x > 10000 else x, input_arr))
-            # print("-----------------------------")
-            # print(input_arr)
-            input_arr = [EisensteinElement(input_arr[i], input_arr[i + 1])
-                         for i in range(0, len(input_arr), 2)]
-            output = decrypt(args['PRIV_KEY_FILE'], input_arr, block=block)
+            input_arr = read_cipher(args['PRIV_KEY_FILE'], args['FILE'])
+            output = decrypt(args['PRIV_KEY_FILE'], input_arr, block=block, jobs=jobs)
             if poly_output:
-                print(EisensteinPolynomial(list(output)))
+                print(EisensteinArrayPolynomial(output))
+            elif block:
+                sys.stdout.buffer.write(decode_chunks(coordinates_to_digits(output)))
             else:
-                print(eisenstein_decode(list(output)))
+                print(eisenstein_decode(output))
         '''
         if not args['gen']:
             # output type: <class 'numpy.ndarray'>
@@ -1,6 +1,12 @@
 #include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
 #include <pybind11/stl.h>
 #include <gmp.h>
+#include <algorithm>
+#include <cmath>
+#include <cstdint>
+#include <stdexcept>
+#include <vector>
 
 using namespace std;
 
@@ -72,6 +78,329 @@ std::string convertFromBase7(const std::string& base7Number) {
 
 namespace py = pybind11;
 
+// Ring kernels over (..., N, 2) int64 buffers of (x, y) pairs, x + yω, highest degree first.
+// They compute exactly what the NumPy paths of EisensteinArray.py and EisensteinResidues.py compute,
+// and release the GIL while they run. Bump KERNEL_VERSION when a signature or result changes,
+// Python ignores a helpers module of another version.
+const int KERNEL_VERSION = 1;
+
+// The loops vectorize, on x86-64 the kernels are compiled for AVX2 as well and the CPU picks the version at load time
+#if defined(__x86_64__) && defined(__GNUC__) && !defined(__clang__)
+#define KERNEL_CLONES __attribute__((target_clones("avx2", "default")))
+#else
+#define KERNEL_CLONES
+#endif
+
+typedef py::array_t<int64_t, py::array::c_style | py::array::forcecast> int_array;
+
+static inline int64_t floor_div(int64_t a, int64_t b) {
+    int64_t q = a / b;
+    return (a % b != 0 && ((a < 0) != (b < 0))) ? q - 1 : q;
+}
+
+// int64 arithmetic that wraps around like NumPy instead of overflowing into undefined behaviour
+static inline int64_t wrap_add(int64_t a, int64_t b) {
+    return (int64_t) ((uint64_t) a + (uint64_t) b);
+}
+
+static inline int64_t wrap_sub(int64_t a, int64_t b) {
+    return (int64_t) ((uint64_t) a - (uint64_t) b);
+}
+
+static inline int64_t wrap_mul(int64_t a, int64_t b) {
+    return (int64_t) ((uint64_t) a * (uint64_t) b);
+}
+
+// round s / d to the nearest integer, halves downwards, same as EisensteinArray._round, d = 2Q > 0, inverse = 1 / d.
+// Below 2^52 the quotient is estimated in floating point and corrected, which is exact and saves the division.
+static inline int64_t round_div(int64_t s, int64_t d, int64_t Q, double inverse) {
+    const int64_t limit = (int64_t) 1 << 52;
+    if (s >= limit || s <= -limit) {
+        int64_t q = floor_div(s, d);
+        return q + (s - q * d > Q);
+    }
+    int64_t q = (int64_t) std::floor((double) s * inverse);
+    int64_t r = s - q * d;
+    if (r < 0) {
+        --q;
+        r += d;
+    } else if (r >= d) {
+        ++q;
+        r -= d;
+    }
+    return q + (r > Q);
+}
+
+// x + yω - m * (ux + uyω)
+static inline void remainder(int64_t x, int64_t y, int64_t mx, int64_t my, int64_t ux, int64_t uy, int64_t *rx,
+                             int64_t *ry) {
+    *rx = wrap_sub(x, wrap_sub(wrap_mul(mx, ux), wrap_mul(my, uy)));
+    *ry = wrap_sub(y, wrap_sub(wrap_add(wrap_mul(mx, uy), wrap_mul(my, ux)), wrap_mul(my, uy)));
+}
+
+static inline int64_t wrap_norm(int64_t x, int64_t y) {
+    return wrap_add(wrap_sub(wrap_mul(x, x), wrap_mul(x, y)), wrap_mul(y, y));
+}
+
+// canonical remainder of x + yω modulo mx + myω, same as EisensteinArray.cvp_mod
+static inline void cvp_mod(int64_t x, int64_t y, int64_t mx, int64_t my, int64_t *rx, int64_t *ry) {
+    int64_t e1 = 2 * mx - my, e2 = 2 * my - mx;
+    int64_t Q = mx * mx - mx * my + my * my, d = 2 * Q;
+    int64_t s = wrap_add(wrap_mul(x, e1), wrap_mul(y, e2)), t = wrap_sub(wrap_mul(y, mx), wrap_mul(x, my));
+    double inverse = 1.0 / (double) d;
+    int64_t x0 = round_div(s, d, Q, inverse), x1 = round_div(t, d, Q, inverse);
+    int64_t y0 = round_div(wrap_add(s, Q), d, Q, inverse), y1 = round_div(wrap_sub(t, Q), d, Q, inverse);
+    int64_t b1x, b1y, b2x, b2y;
+    remainder(x, y, mx, my, wrap_add(x0, x1), wrap_mul(2, x1), &b1x, &b1y);
+    remainder(x, y, mx, my, wrap_add(y0, y1), wrap_add(wrap_mul(2, y1), 1), &b2x, &b2y);
+    int64_t n1 = wrap_norm(b1x, b1y), n2 = wrap_norm(b2x, b2y);
+    if (n1 < n2 || (n1 == n2 && x0 < y0)) {
+        *rx = b1x;
+        *ry = b1y;
+    } else {
+        *rx = b2x;
+        *ry = b2y;
+    }
+}
+
+KERNEL_CLONES static void reduce_buffer(int64_t *a, size_t count, int64_t mx, int64_t my) {
+    for (size_t i = 0; i < count; ++i) {
+        cvp_mod(a[2 * i], a[2 * i + 1], mx, my, &a[2 * i], &a[2 * i + 1]);
+    }
+}
+
+// power of ω and sign of a unit coefficient (x, y), -1 if it isn't one of ±1, ±ω, ±ω^2 = ∓(1 + ω)
+static inline int unit_power(int64_t x, int64_t y, bool *negative) {
+    if (y == 0 && (x == 1 || x == -1)) {
+        *negative = x < 0;
+        return 0;
+    }
+    if (x == 0 && (y == 1 || y == -1)) {
+        *negative = y < 0;
+        return 1;
+    }
+    if (x == y && (x == 1 || x == -1)) {
+        *negative = x > 0;
+        return 2;
+    }
+    return -1;
+}
+
+static inline uint64_t magnitude(int64_t x) {
+    return x < 0 ? -(uint64_t) x : (uint64_t) x;
+}
+
+// What the choice of loops and of the width of the sums depends on
+struct BlockShape {
+    size_t weight = 0;      // nonzero coefficients
+    bool units = true;      // whether all of them are units
+    uint64_t maximum = 0;   // largest |x| or |y|
+    uint64_t total = 0;     // sum of |x| + |y|, saturated at 2^62
+
+    BlockShape(const int64_t *a, size_t N) {
+        for (size_t i = 0; i < N; ++i) {
+            int64_t x = a[2 * i], y = a[2 * i + 1];
+            if (x == 0 && y == 0) {
+                continue;
+            }
+            bool negative;
+            units = units && unit_power(x, y, &negative) >= 0;
+            ++weight;
+            uint64_t mx = magnitude(x), my = magnitude(y);
+            maximum = std::max(maximum, std::max(mx, my));
+            total = std::min(total + std::min(mx + my, (uint64_t) 1 << 62), (uint64_t) 1 << 62);
+        }
+    }
+
+    // a unit coefficient takes an addition per coordinate, another one a multiplication for each of x and y
+    size_t cost() const {
+        return units ? weight : 2 * weight;
+    }
+};
+
+// Buffers of rotate_and_add, its sums wrap around like NumPy int64 instead of overflowing into undefined behaviour
+template <typename U>
+struct RotationBuffers {
+    std::vector<U> doubled, sums;
+
+    explicit RotationBuffers(size_t N) : doubled(4 * N), sums(6 * N) {}
+};
+
+struct RingBuffers {
+    RotationBuffers<uint32_t> narrow;
+    RotationBuffers<uint64_t> wide;
+
+    explicit RingBuffers(size_t N) : narrow(N), wide(N) {}
+};
+
+// out = a * b, summed up in U, S is the signed type of U
+template <typename U, typename S>
+static void rotate_and_add(const int64_t *a, const int64_t *b, int64_t *out, size_t N, RotationBuffers<U> &buffers) {
+    // b written out twice, so that the terms of a[i] are one contiguous run of coefficients N - 1 - i .. 2N - 2 - i
+    U *doubled = buffers.doubled.data();
+    for (size_t j = 0; j < 2 * N; ++j) {
+        doubled[j] = doubled[2 * N + j] = (U) b[j];
+    }
+    // interleaved (x, y) sums of the rotations per power of ω
+    std::fill(buffers.sums.begin(), buffers.sums.end(), 0);
+    U *sums = buffers.sums.data();
+    for (size_t i = 0; i < N; ++i) {
+        int64_t ax = a[2 * i], ay = a[2 * i + 1];
+        if (ax == 0 && ay == 0) {
+            continue;
+        }
+        const U *__restrict__ rotation = doubled + 2 * (N - 1 - i);
+        bool negative;
+        int power = unit_power(ax, ay, &negative);
+        if (power < 0) {
+            // (ax + ayω) * b = ax * b + ω * (ay * b)
+            U *__restrict__ s0 = sums, *__restrict__ s1 = sums + 2 * N;
+            U ux = (U) ax, uy = (U) ay;
+            for (size_t k = 0; k < 2 * N; ++k) {
+                s0[k] += ux * rotation[k];
+                s1[k] += uy * rotation[k];
+            }
+            continue;
+        }
+        U *__restrict__ total = sums + 2 * N * power;
+        if (negative) {
+            for (size_t k = 0; k < 2 * N; ++k) {
+                total[k] -= rotation[k];
+            }
+        } else {
+            for (size_t k = 0; k < 2 * N; ++k) {
+                total[k] += rotation[k];
+            }
+        }
+    }
+    // s0 + ω*s1 + ω^2*s2, ω*(x, y) = (-y, x - y) and ω^2*(x, y) = (y - x, -x)
+    const U *s0 = sums, *s1 = sums + 2 * N, *s2 = sums + 4 * N;
+    for (size_t k = 0; k < 2 * N; k += 2) {
+        out[k] = (S) (U) (s0[k] - s1[k + 1] + s2[k + 1] - s2[k]);
+        out[k + 1] = (S) (U) (s0[k + 1] + s1[k] - s1[k + 1] - s2[k]);
+    }
+}
+
+// out = a * b in Z[ω][x]/(x^N - 1), out[k] = sum over i of a[i] * b[(k - i - 1) % N].
+// The outer loop runs over the cheaper operand and skips its zeros. A unit coefficient adds a rotation of the
+// other operand to the sum of its power of ω, like UnitPolynomial.apply, so the products of ETRU, whose keys,
+// blinding polynomials and residues mod p are units, take additions only. No coordinate of a product exceeds
+// 2 * (sum of |x| + |y| of a) * (largest coordinate of b), when that fits into 32 bits the sums run in 32 bits,
+// twice as many per vector instruction.
+KERNEL_CLONES static void ring_multiply_block(const int64_t *a, const int64_t *b, int64_t *out, size_t N, RingBuffers &buffers) {
+    BlockShape a_shape(a, N), b_shape(b, N);
+    if (b_shape.cost() < a_shape.cost() || (b_shape.cost() == a_shape.cost() && b_shape.units && !a_shape.units)) {
+        std::swap(a, b);
+        std::swap(a_shape, b_shape);
+    }
+    const uint64_t narrow = (uint64_t) 1 << 30;
+    if (a_shape.total < narrow && b_shape.maximum < narrow && a_shape.total * b_shape.maximum < narrow) {
+        rotate_and_add<uint32_t, int32_t>(a, b, out, N, buffers.narrow);
+    } else {
+        rotate_and_add<uint64_t, int64_t>(a, b, out, N, buffers.wide);
+    }
+}
+
+static void ring_multiply_buffer(const int64_t *blocks, const int64_t *key, int64_t *out, size_t count, size_t N) {
+    RingBuffers buffers(N);
+    for (size_t block = 0; block < count; ++block) {
+        ring_multiply_block(blocks + 2 * N * block, key, out + 2 * N * block, N, buffers);
+    }
+}
+
+// number of (N, 2) blocks in a (..., N, 2) array
+static size_t block_count(const int_array &blocks, size_t N) {
+    if (blocks.ndim() < 2 || (size_t) blocks.shape(blocks.ndim() - 2) != N || blocks.shape(blocks.ndim() - 1) != 2) {
+        throw std::invalid_argument("Blocks must have shape (..., N, 2) with the N of the key");
+    }
+    return N == 0 ? 0 : (size_t) blocks.size() / (2 * N);
+}
+
+static size_t key_size(const int_array &key) {
+    if (key.ndim() != 2 || key.shape(1) != 2) {
+        throw std::invalid_argument("Key must have shape (N, 2)");
+    }
+    return (size_t) key.shape(0);
+}
+
+static int_array empty_like(const int_array &a) {
+    return int_array(std::vector<py::ssize_t>(a.shape(), a.shape() + a.ndim()));
+}
+
+int_array ring_multiply(int_array blocks, int_array key) {
+    size_t N = key_size(key), count = block_count(blocks, N);
+    int_array out = empty_like(blocks);
+    const int64_t *a = blocks.data(), *b = key.data();
+    int64_t *c = out.mutable_data();
+    {
+        py::gil_scoped_release release;
+        ring_multiply_buffer(a, b, c, count, N);
+    }
+    return out;
+}
+
+int_array reduce(int_array a, int64_t mx, int64_t my) {
+    if (mx == 0 && my == 0) {
+        throw std::invalid_argument("Reduction modulo 0");
+    }
+    if (a.ndim() < 1 || a.shape(a.ndim() - 1) != 2) {
+        throw std::invalid_argument("Coefficients must have shape (..., 2)");
+    }
+    int_array out = empty_like(a);
+    size_t count = (size_t) a.size() / 2;
+    int64_t *c = out.mutable_data();
+    std::copy(a.data(), a.data() + 2 * count, c);
+    {
+        py::gil_scoped_release release;
+        reduce_buffer(c, count, mx, my);
+    }
+    return out;
+}
+
+int_array encrypt_batch(int_array msg_blocks, int_array rand_blocks, int_array ph, int64_t qx, int64_t qy) {
+    size_t N = key_size(ph), count = block_count(rand_blocks, N);
+    if (block_count(msg_blocks, N) != count) {
+        throw std::invalid_argument("Message and blinding blocks differ in number");
+    }
+    int_array out = empty_like(rand_blocks);
+    const int64_t *m = msg_blocks.data(), *r = rand_blocks.data(), *key = ph.data();
+    int64_t *c = out.mutable_data();
+    {
+        py::gil_scoped_release release;
+        ring_multiply_buffer(r, key, c, count, N);
+        for (size_t i = 0; i < 2 * N * count; ++i) {
+            c[i] = wrap_add(c[i], m[i]);
+        }
+        reduce_buffer(c, N * count, qx, qy);
+    }
+    return out;
+}
+
+// f_p of size 0 is f_p = 1, the private keys f = 1 + p*F
+int_array decrypt_batch(int_array cipher_blocks, int_array f, int_array f_p, int64_t px, int64_t py, int64_t qx,
+                        int64_t qy) {
+    size_t N = key_size(f), count = block_count(cipher_blocks, N);
+    bool unit_f_p = f_p.size() == 0;
+    if (!unit_f_p && key_size(f_p) != N) {
+        throw std::invalid_argument("f and f_p differ in N");
+    }
+    int_array out = empty_like(cipher_blocks);
+    const int64_t *e = cipher_blocks.data(), *key = f.data(), *key_p = unit_f_p ? nullptr : f_p.data();
+    int64_t *c = out.mutable_data();
+    {
+        py::gil_scoped_release release;
+        ring_multiply_buffer(e, key, c, count, N);
+        reduce_buffer(c, N * count, qx, qy);
+        if (!unit_f_p) {
+            std::vector<int64_t> a(c, c + 2 * N * count);
+            ring_multiply_buffer(a.data(), key_p, c, count, N);
+        }
+        reduce_buffer(c, N * count, px, py);
+    }
+    return out;
+}
+
+
 PYBIND11_MODULE(helpers, m) {
     m.def("extended_gcd", &extended_gcd, "Extended euclid algorithm, output [g,a,b] satisfy ax+by=gcd(a,b)=g");
     m.def("is_prime", &is_prime, "Check if a number is prime.");
@@ -89,4 +418,14 @@ PYBIND11_MODULE(helpers, m) {
     m.def("convertFromBase7", [](const std::string& base7Number) {
         return convertFromBase7(base7Number);
     });
+    m.attr("KERNEL_VERSION") = KERNEL_VERSION;
+    m.def("ring_multiply", &ring_multiply, py::arg("blocks"), py::arg("key"),
+          "Products of (..., N, 2) blocks with a (N, 2) key in Z[ω][x]/(x^N - 1).");
+    m.def("reduce", &reduce, py::arg("a"), py::arg("mx"), py::arg("my"),
+          "Canonical remainders of a (..., 2) array modulo mx + my*ω, the same as cvp_mod.");
+    m.def("encrypt_batch", &encrypt_batch, py::arg("msg_blocks"), py::arg("rand_blocks"), py::arg("ph"),
+          py::arg("qx"), py::arg("qy"), "(r * p*h + m) mod q of (B, N, 2) blocks.");
+    m.def("decrypt_batch", &decrypt_batch, py::arg("cipher_blocks"), py::arg("f"), py::arg("f_p"), py::arg("px"),
+          py::arg("py"), py::arg("qx"), py::arg("qy"),
+          "(f_p * ((f * e) mod q)) mod p of (B, N, 2) blocks, f_p of size 0 stands for 1.");
 }
\ No newline at end of file
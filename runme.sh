@@ -1,3 +1,8 @@
-!/bin/bash
+#!/bin/bash
 
-g++ -O3 -Wall -shared -std=c++11 -undefined dynamic_lookup $(python3 -m pybind11 --includes) helpers.cpp -lgmp -o helpers.so
\ No newline at end of file
+# macOS resolves the Python symbols when the module is loaded
+if [ "$(uname)" = "Darwin" ]; then
+    LDFLAGS="-undefined dynamic_lookup"
+fi
+
+g++ -O3 -Wall -shared -std=c++11 -fPIC $LDFLAGS $(python3 -m pybind11 --includes) helpers.cpp -lgmp -o helpers$(python3-config --extension-suffix)
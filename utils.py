@@ -1,17 +1,26 @@
 import binascii
 import pickle
-import helpers
 import numpy as np
 
-from Eisenstein import EisensteinElement
+try:
+    import helpers
+except ImportError:
+    helpers = None
+
+from Eisenstein import RP_ELEMENTS, EisensteinElement
 from EisensteinPolynomial import EisensteinPolynomial
 
-N = 251
+# Coordinates of R_p = {0, ±1, ±ω, ±ω^2} indexed by base-7 digit, same order as RP_ELEMENTS
+RP_COORDINATES = np.array([[0, 0], [1, 0], [-1, 0], [0, 1], [0, -1], [1, 1], [-1, -1]], dtype=np.int64)
+# Base-7 digit of R_p coordinates (x, y), indexed by [x + 1, y + 1], -1 where (x, y) is not in R_p
+RP_DIGITS = np.full((3, 3), -1, dtype=np.int64)
+RP_DIGITS[RP_COORDINATES[:, 0] + 1, RP_COORDINATES[:, 1] + 1] = np.arange(7)
 
 
-def message_to_poly(input_str: str) -> EisensteinPolynomial:
+def message_to_poly(input_str: str, N=None) -> EisensteinPolynomial:
     """
     Convert message to Eisenstein Polynomial
+    N is the degree of the ring, longer messages raise OverflowError
     """
     input_arr = [ord(char) for char in input_str]
 
@@ -25,7 +34,7 @@ def message_to_poly(input_str: str) -> EisensteinPolynomial:
         input_arr.append(0)
 
     input_arr = [input_arr[i:i + 2] for i in range(0, len(input_arr), 2)]
-    if len(input_arr) > N:
+    if N is not None and len(input_arr) > N:
         raise OverflowError("Input String is too large for current N, use block mode")
 
     coefficients = [EisensteinElement(x, y) for x, y in input_arr]
@@ -61,6 +70,64 @@ def padding_decode(input_arr, block_size):
     return input_arr[:-(block_size + zeros_to_remove)]
 
 
+# Block-local encoding: every group of GROUP_BYTES bytes becomes GROUP_DIGITS base-7 digits, 7^20 > 2^56
+GROUP_BYTES = 7
+GROUP_DIGITS = 20
+# Every block starts with the number of bytes it holds in LENGTH_DIGITS base-7 digits
+LENGTH_DIGITS = 3
+GROUP_POWERS = 7 ** np.arange(GROUP_DIGITS - 1, -1, -1, dtype=np.uint64)
+GROUP_SHIFTS = np.arange(8 * (GROUP_BYTES - 1), -1, -8, dtype=np.uint64)
+LENGTH_POWERS = 7 ** np.arange(LENGTH_DIGITS - 1, -1, -1)
+
+
+def chunk_size(n: int) -> int:
+    """Bytes of one block of n base-7 digits in the block-local encoding"""
+    return (n - LENGTH_DIGITS) // GROUP_DIGITS * GROUP_BYTES
+
+
+def encode_chunks(data: bytes, n: int) -> np.ndarray:
+    """
+    Block-local encoding of bytes: every chunk of chunk_size(n) bytes becomes one row of n base-7 digits,
+    independently of the others, in time linear in len(data).
+    :return: (block_count, n) digit array, the last chunk may be shorter
+    """
+    size = chunk_size(n)
+    block_count = -(-len(data) // size)
+    padded = np.zeros(block_count * size, dtype=np.uint8)
+    padded[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+    values = (padded.reshape(-1, GROUP_BYTES).astype(np.uint64) << GROUP_SHIFTS).sum(axis=1, dtype=np.uint64)
+    lengths = np.full(block_count, size)
+    lengths[-1:] = len(data) - (block_count - 1) * size
+    width = size // GROUP_BYTES * GROUP_DIGITS
+    digits = np.zeros((block_count, n), dtype=np.uint8)
+    digits[:, :LENGTH_DIGITS] = lengths[:, None] // LENGTH_POWERS % 7
+    digits[:, LENGTH_DIGITS:LENGTH_DIGITS + width] = (values[:, None] // GROUP_POWERS % 7).reshape(block_count, width)
+    return digits
+
+
+def decode_chunks(digits: np.ndarray) -> bytes:
+    """Inverse function of encode_chunks(), digits is a (block_count, n) array"""
+    block_count, n = digits.shape
+    size = chunk_size(n)
+    lengths = digits[:, :LENGTH_DIGITS].astype(np.int64) @ LENGTH_POWERS
+    groups = digits[:, LENGTH_DIGITS:LENGTH_DIGITS + size // GROUP_BYTES * GROUP_DIGITS].reshape(-1, GROUP_DIGITS)
+    values = (groups.astype(np.uint64) * GROUP_POWERS).sum(axis=1, dtype=np.uint64)
+    if (lengths > size).any() or (values >> np.uint64(8 * GROUP_BYTES)).any():
+        raise ValueError("Invalid block encoding, the block was not decrypted correctly")
+    chunks = ((values[:, None] >> GROUP_SHIFTS) & 0xFF).astype(np.uint8).reshape(block_count, size)
+    return chunks[np.arange(size) < lengths[:, None]].tobytes()
+
+
+def coordinates_to_digits(coordinates: np.ndarray) -> np.ndarray:
+    """Base-7 digits of a (..., 2) array of R_p coordinates, the inverse of RP_COORDINATES[digits]"""
+    if coordinates.size and np.abs(coordinates).max() > 1:
+        raise ValueError("Coefficient not in R_p, the block was not decrypted correctly")
+    digits = RP_DIGITS[coordinates[..., 0] + 1, coordinates[..., 1] + 1]
+    if (digits < 0).any():
+        raise ValueError("Coefficient not in R_p, the block was not decrypted correctly")
+    return digits.astype(np.uint8)
+
+
 def save_dict_with_pickle(dictionary, file_path):
     with open(file_path, 'wb') as file:
         pickle.dump(dictionary, file)
@@ -99,57 +166,45 @@ def convert_to_base7(number):
     return result
 
 
-def eisenstein_encode(Message: str) -> list:
+def eisenstein_encode(Message: str, N=None) -> list:
     """
     Convert String to a list, which elements are EisensteinElements
     Specially designed for R_p = {0, ±1, ±ω, ±ω^2}
+    N is the degree of the ring, longer messages raise OverflowError
     """
-    rp_elements = [
-        EisensteinElement(0, 0),
-        EisensteinElement(1, 0),
-        EisensteinElement(-1, 0),
-        EisensteinElement(0, 1),
-        EisensteinElement(0, -1),
-        EisensteinElement(1, 1),
-        EisensteinElement(-1, -1),
-    ]
     Message = Message.encode('utf-8')  # -> bit string
     Message = int(binascii.hexlify(Message), 16)  # -> int
-    Message = helpers.convertToBase7(f"{Message}")  # -> str
-    # The following line is equal to the line above.
-    # message = str(convert_to_base7(message))
+    if helpers is not None:
+        Message = helpers.convertToBase7(f"{Message}")  # -> str
+    else:
+        # The following line is equal to the line above.
+        Message = convert_to_base7(Message)
 
-    if len(Message) > N:
+    if N is not None and len(Message) > N:
         raise OverflowError(f"Input String is too large({len(Message)}) for current N, use block mode")
     encoded_list = []
     for s in Message:
-        encoded_list.append(rp_elements[int(s)])
+        encoded_list.append(RP_ELEMENTS[int(s)])
 
     return encoded_list
 
 
-def eisenstein_decode(EncodedList: list) -> str:
-    """Inverse function of eisenstein_encode()"""
-    rp_elements = [
-        EisensteinElement(0, 0),
-        EisensteinElement(1, 0),
-        EisensteinElement(-1, 0),
-        EisensteinElement(0, 1),
-        EisensteinElement(0, -1),
-        EisensteinElement(1, 1),
-        EisensteinElement(-1, -1),
-    ]
-    message = ''
-    for e in EncodedList:
-        index = rp_elements.index(e)
-        message += str(index)
-    message = helpers.convertFromBase7(message)
-    hex_str = hex(int(message))[2:]
-    if len(hex_str)%2 != 0:
-        hex_str+=b'0'
-    byte_str = binascii.unhexlify(hex_str)
-    decoded_message = byte_str.decode('utf-8')
-    return decoded_message
+def eisenstein_decode_array(coefficients: np.ndarray) -> bytes:
+    """
+    Table-driven inverse of eisenstein_encode() without the utf-8 decoding.
+    Input: (len, 2) R_p coordinates, highest degree first
+    """
+    digits = coordinates_to_digits(np.asarray(coefficients).reshape(-1, 2))
+    number = int((digits + ord('0')).tobytes(), 7) if len(digits) else 0
+    # to_bytes pads odd length hex numbers at the front, where unhexlify needs it
+    return number.to_bytes((number.bit_length() + 7) // 8, 'big')
+
+
+def eisenstein_decode(EncodedList) -> str:
+    """Inverse function of eisenstein_encode(), EncodedList is a list of EisensteinElement or a (len, 2) array"""
+    if not isinstance(EncodedList, np.ndarray):
+        EncodedList = np.array([[e.x, e.y] for e in EncodedList], dtype=np.int64)
+    return eisenstein_decode_array(EncodedList).decode('utf-8')
 
 
 if __name__ == "__main__":